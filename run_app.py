@@ -1,13 +1,23 @@
+import os
+
 import uvicorn
 
 
 def main() -> None:
-    """Run the FastAPI application with uvicorn."""
+    """Run the FastAPI application with uvicorn.
+
+    uvloop and httptools (both installed via `uvicorn[standard]`) replace the default
+    asyncio event loop and HTTP parser. Each worker is a separate process with its own
+    event loop and its own pooled HTTP clients (created in the app lifespan); set
+    `UVICORN_WORKERS` to size the pool. Use `run_app_dev.py` for auto-reload.
+    """
     uvicorn.run(
         "src.main:app",
         host="127.0.0.1",
         port=8000,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("UVICORN_WORKERS", "4")),
     )
 
 
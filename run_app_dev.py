@@ -0,0 +1,21 @@
+import uvicorn
+
+
+def main() -> None:
+    """Run the FastAPI application with uvicorn in a single auto-reloading worker.
+
+    Uses the same uvloop event loop and httptools parser as `run_app.py`, so local
+    timings are representative of production.
+    """
+    uvicorn.run(
+        "src.main:app",
+        host="127.0.0.1",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        reload=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,58 @@
-from abc import ABC, abstractmethod
+import asyncio
+from collections.abc import Sequence
+from typing import Protocol
 
+from src.errors import IpProviderError
 from src.models.common import IPGeolocationData
 
+# Upper bound on concurrent upstream requests issued for a single batch, so a large
+# batch does not trip provider rate limits or exhaust the connection pool.
+DEFAULT_BATCH_CONCURRENCY = 16
 
-class BaseIPLookupClient(ABC):
-    """Abstract base for all IP geolocation clients.
+
+class BaseIPLookupClient(Protocol):
+    """Structural interface for all IP geolocation clients.
 
     Concrete implementations (e.g. ipapi.co, MaxMind, ipstack) should implement
     these methods and map provider-specific responses into a normalized
-    geolocation shape (e.g. IpGeolocationData).
+    geolocation shape (e.g. IpGeolocationData). They do not need to inherit from
+    this class; conformance is checked statically (e.g. by mypy).
     """
 
-    @abstractmethod
     async def lookup_ip(self, ip: str) -> IPGeolocationData:
         """Look up geolocation information for an explicit IP address."""
-        raise NotImplementedError
+        ...
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        """Look up geolocation information for several IP addresses.
+
+        Results are returned in input order; a provider error for one IP is returned
+        in its slot instead of failing the whole batch.
+        """
+        ...
 
-    @abstractmethod
     async def lookup_client_ip(self) -> IPGeolocationData:
         """Look up geolocation information for the calling client's IP address."""
-        raise NotImplementedError
+        ...
+
+
+async def lookup_ips_concurrently(
+    client: BaseIPLookupClient,
+    ips: Sequence[str],
+    max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+) -> list[IPGeolocationData | IpProviderError]:
+    """Default `lookup_ips` implementation: fan out `client.lookup_ip` calls concurrently.
+
+    N lookups complete in roughly the slowest round trip instead of the sum of all of
+    them. Provider errors are returned in place; anything else propagates.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def lookup_one(ip: str) -> IPGeolocationData | IpProviderError:
+        async with semaphore:
+            try:
+                return await client.lookup_ip(ip)
+            except IpProviderError as exc:
+                return exc
+
+    return list(await asyncio.gather(*(lookup_one(ip) for ip in ips)))
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Coroutine, Sequence
+from typing import Any, Generic, TypeVar
+
+from src.clients.base import BaseIPLookupClient
+from src.errors import InvalidIpError, IpProviderError, ReservedIpError
+from src.models.common import IPGeolocationData
+
+# Geolocation of an IP is stable on the timescale of hours; errors caused by the input
+# itself (invalid/reserved IPs) are cached for less time in case a provider changes its mind.
+CACHE_MAXSIZE = 100_000
+CACHE_TTL_SECONDS = 3600.0
+ERROR_CACHE_TTL_SECONDS = 300.0
+
+# In-flight key for client IP lookups; cannot collide with an IP literal.
+CLIENT_IP_INFLIGHT_KEY = "<client>"
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Bounded in-process cache with per-entry expiry and LRU eviction.
+
+    All operations are synchronous, so they are atomic with respect to the event loop
+    and need no lock.
+    """
+
+    def __init__(self, maxsize: int = CACHE_MAXSIZE, clock: Callable[[], float] = time.monotonic) -> None:
+        self._maxsize = maxsize
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> V | None:
+        """Return the cached value for `key`, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V, ttl_seconds: float) -> None:
+        """Store `value` under `key` for `ttl_seconds`, evicting the least recently used entry if full."""
+        self._entries[key] = (self._clock() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+
+class CachingIPLookupClient:
+    """Decorator client that serves repeated explicit-IP lookups from an in-process cache.
+
+    Cache hits short-circuit without any upstream I/O. Invalid and reserved IP errors
+    are cached as well (with a shorter TTL) so garbage input does not keep hitting the
+    provider. Concurrent misses for the same IP are coalesced into a single upstream
+    call (single-flight) that every caller awaits. Client IP lookups are not cached,
+    since the key is not known up front, but concurrent ones are still coalesced.
+
+    Instances are meant to be long-lived, so the cache and in-flight map are shared
+    across requests.
+    """
+
+    def __init__(
+        self,
+        client: BaseIPLookupClient,
+        cache: TTLCache[IPGeolocationData | IpProviderError],
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        error_ttl_seconds: float = ERROR_CACHE_TTL_SECONDS,
+    ) -> None:
+        self._client = client
+        self._cache = cache
+        self._ttl_seconds = ttl_seconds
+        self._error_ttl_seconds = error_ttl_seconds
+        self._inflight: dict[str, asyncio.Task[IPGeolocationData]] = {}
+
+    async def lookup_ip(self, ip: str) -> IPGeolocationData:
+        """Look up geolocation information for an explicit IP address, using the cache first."""
+        cached = self._cache.get(ip)
+        if isinstance(cached, IpProviderError):
+            raise cached.with_traceback(None)
+        if cached is not None:
+            return cached
+
+        return await self._single_flight(ip, lambda: self._fetch(ip))
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        """Look up several IP addresses, serving hits from the cache.
+
+        All distinct misses go to the wrapped client in a single `lookup_ips` call, so a
+        provider with a native batch endpoint answers them in one request. Provider
+        errors are returned in place.
+        """
+        outcomes: dict[str, IPGeolocationData | IpProviderError] = {}
+        misses: list[str] = []
+        for ip in dict.fromkeys(ips):
+            cached = self._cache.get(ip)
+            if cached is None:
+                misses.append(ip)
+            else:
+                outcomes[ip] = cached
+
+        if misses:
+            for ip, outcome in zip(misses, await self._client.lookup_ips(misses), strict=True):
+                self._store(ip, outcome)
+                outcomes[ip] = outcome
+
+        return [outcomes[ip] for ip in ips]
+
+    async def lookup_client_ip(self) -> IPGeolocationData:
+        """Look up geolocation information for the calling client IP (coalesced, not cached)."""
+        return await self._single_flight(CLIENT_IP_INFLIGHT_KEY, self._client.lookup_client_ip)
+
+    async def _single_flight(
+        self, key: str, lookup: Callable[[], Coroutine[Any, Any, IPGeolocationData]]
+    ) -> IPGeolocationData:
+        """Await the in-flight lookup for `key`, starting one if there is none."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(lookup())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        # Shield the shared task so one caller being cancelled (e.g. a client
+        # disconnect) does not cancel the lookup for everybody else.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, ip: str) -> IPGeolocationData:
+        """Call the wrapped client and store the outcome in the cache."""
+        try:
+            data = await self._client.lookup_ip(ip)
+        except IpProviderError as exc:
+            self._store(ip, exc)
+            raise
+
+        self._store(ip, data)
+        return data
+
+    def _store(self, ip: str, outcome: IPGeolocationData | IpProviderError) -> None:
+        """Cache a lookup outcome; only errors caused by the IP itself are cached."""
+        if isinstance(outcome, InvalidIpError | ReservedIpError):
+            self._cache.set(ip, outcome, self._error_ttl_seconds)
+        elif not isinstance(outcome, IpProviderError):
+            self._cache.set(ip, outcome, self._ttl_seconds)
+
+    def _forget(self, key: str, task: asyncio.Task[IPGeolocationData]) -> None:
+        """Drop a finished lookup from the in-flight map."""
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved in case every caller was cancelled before
+        # awaiting it, which would otherwise log "exception was never retrieved".
+        if not task.cancelled():
+            task.exception()
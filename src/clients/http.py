@@ -0,0 +1,38 @@
+from typing import Any
+
+import httpx
+import orjson
+
+from src.errors import UpstreamServiceError
+
+# Keep enough idle connections around to serve bursts without re-handshaking, and
+# fail fast on connect so a dead upstream does not hold requests for the full timeout.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50, max_connections=200, keepalive_expiry=30.0)
+HTTP_TIMEOUT = httpx.Timeout(5.0, connect=2.0)
+
+
+def create_http_client(base_url: str) -> httpx.AsyncClient:
+    """Create a pooled, HTTP/2-enabled client for a single upstream host.
+
+    One client per upstream host keeps pool limits isolated, so a slow provider
+    cannot starve connections needed by another one.
+    """
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=True,
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT,
+    )
+
+
+def parse_json_response(response: httpx.Response) -> Any:
+    """Decode a provider response body as JSON (an object, or an array for batch endpoints).
+
+    The raw bytes go straight to orjson, which validates UTF-8 itself; this skips
+    httpx's charset detection and bytes-to-str decode. Both providers document
+    UTF-8 JSON responses.
+    """
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as exc:
+        raise UpstreamServiceError(f"Failed to decode IP provider response as JSON: {exc}") from exc
@@ -1,36 +1,91 @@
+import re
+from collections.abc import Callable, Sequence
 from http import HTTPStatus
 from typing import Any
 
 import httpx
 
-from src.clients.base import BaseIPLookupClient
-from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
-from src.models.common import IPGeolocationData
-
-
-class IpApiCo(BaseIPLookupClient):
+from src.clients.base import lookup_ips_concurrently
+from src.clients.http import parse_json_response
+from src.errors import InvalidIpError, IpNotFoundError, IpProviderError, ReservedIpError, UpstreamServiceError
+from src.models.common import IPGeolocationData, coerce_coordinate
+
+# The documented ipapi.co reasons, keyed by their normalized text. Most error payloads
+# hit this table with a single hash probe.
+_KNOWN_REASONS: dict[str, str] = {
+    "invalid ip address": "invalid",
+    "reserved ip address": "reserved",
+    "ratelimited": "rate_limit",
+    "quota exceeded": "rate_limit",
+}
+
+# Fallback for undocumented reasons: every keyword found in a single scan is collected,
+# and the first of them in `_ERROR_FACTORIES` order selects the domain exception.
+_ERROR_REASON_RE = re.compile(
+    r"(?P<invalid>invalid)|(?P<reserved>reserved)|(?P<rate_limit>ratelimited|quota)", re.IGNORECASE
+)
+
+# Listed in priority order, used when a reason matches more than one kind.
+_ERROR_FACTORIES: dict[str, Callable[[str], IpProviderError]] = {
+    # Syntactically invalid IP.
+    "invalid": InvalidIpError,
+    # Reserved / private address, e.g. 127.0.0.1, 192.168.x.x.
+    "reserved": ReservedIpError,
+    # Rate limiting / quota exceeded signalled via reason or 200 with error.
+    "rate_limit": lambda reason: UpstreamServiceError(f"IP provider rate limit or quota exceeded: {reason}"),
+}
+
+# Documented ipapi.co HTTP error codes, mapped to the domain error they signal.
+_HTTP_ERROR_FACTORIES: dict[int, Callable[[httpx.Response], IpProviderError]] = {
+    # 400 Bad Request – something is wrong with our request to the provider.
+    HTTPStatus.BAD_REQUEST: lambda response: UpstreamServiceError(
+        f"IP provider returned HTTP 400 Bad Request: {response.text}"
+    ),
+    # 403 Authentication Failed.
+    HTTPStatus.FORBIDDEN: lambda _: UpstreamServiceError("Authentication with IP provider failed (HTTP 403)."),
+    # 404 URL Not Found (e.g. malformed endpoint).
+    HTTPStatus.NOT_FOUND: lambda _: IpNotFoundError("No geolocation information found for this IP address."),
+    # 405 Method Not Allowed – should not happen for GET, but handle defensively.
+    HTTPStatus.METHOD_NOT_ALLOWED: lambda _: UpstreamServiceError(
+        "HTTP method not allowed when calling IP provider (HTTP 405)."
+    ),
+    # 429 Quota exceeded / rate limit hit.
+    HTTPStatus.TOO_MANY_REQUESTS: lambda _: UpstreamServiceError(
+        "IP provider rate limit or quota exceeded (HTTP 429)."
+    ),
+}
+
+
+class IpApiCo:
     """Client for the https://ipapi.co/ IP geolocation API.
 
     This client is intentionally minimal and focused on the subset of fields
     we expose via our own API, providing a normalized shape that decouples
     the rest of the application from the third-party response format.
+
+    The underlying `httpx.AsyncClient` is injected and owned by the caller (the
+    application lifespan), so connections are pooled and reused across lookups. It
+    must be configured with `base_url=DEFAULT_BASE_URL`; requests use relative paths.
     """
 
-    def __init__(self, base_url: str = "https://ipapi.co", timeout_seconds: float = 5.0) -> None:
-        self._base_url = base_url.rstrip("/")
-        self._timeout_seconds = timeout_seconds
+    DEFAULT_BASE_URL = "https://ipapi.co"
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        self._http_client = http_client
 
     async def lookup_ip(self, ip: str) -> IPGeolocationData:
         """Look up geolocation information for an explicit IP address."""
-        url = f"{self._base_url}/{ip}/json/"
-        return await self._request(url)
+        return await self._request("/" + ip + "/json/")
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        """Look up several IP addresses concurrently; provider errors are returned in place."""
+        return await lookup_ips_concurrently(self, ips)
 
     async def lookup_client_ip(self) -> IPGeolocationData:
         """Look up geolocation information for the calling client IP."""
-        url = f"{self._base_url}/json/"
-        return await self._request(url)
+        return await self._request("/json/")
 
-    async def _request(self, url: str) -> IPGeolocationData:
+    async def _request(self, path: str) -> IPGeolocationData:
         """Perform the HTTP request and normalize the response.
 
         The ipapi.co API returns a JSON payload that may contain an "error" flag
@@ -39,45 +94,32 @@ class IpApiCo(BaseIPLookupClient):
         https://ipapi.co/api/#specific-location-field6
         """
         try:
-            async with httpx.AsyncClient(timeout=self._timeout_seconds) as client:
-                response = await client.get(url)
+            response = await self._http_client.get(path)
         except httpx.RequestError as exc:
             raise UpstreamServiceError(f"Request to IP provider failed: {repr(exc)}") from exc
 
-        self._handle_http_errors(response)
-
-        data = self._parse_json(response)
-        self._handle_provider_error(data)
+        # The overwhelmingly common 200 OK needs no status mapping at all.
+        if response.status_code != HTTPStatus.OK:
+            self._handle_http_errors(response)
 
-        return self._normalize_payload(data)
+        return self._to_geolocation(parse_json_response(response))
 
     def _handle_http_errors(self, response: httpx.Response) -> None:
         """Map HTTP status codes from the provider to domain-specific errors."""
         status_code = response.status_code
 
         # Handle documented HTTP error codes.
-        if status_code == HTTPStatus.BAD_REQUEST:
-            # 400 Bad Request – something is wrong with our request to the provider.
-            raise UpstreamServiceError(f"IP provider returned HTTP 400 Bad Request: {response.text}")
-        if status_code == HTTPStatus.FORBIDDEN:
-            # 403 Authentication Failed.
-            raise UpstreamServiceError("Authentication with IP provider failed (HTTP 403).")
-        if status_code == HTTPStatus.METHOD_NOT_ALLOWED:
-            # 405 Method Not Allowed – should not happen for GET, but handle defensively.
-            raise UpstreamServiceError("HTTP method not allowed when calling IP provider (HTTP 405).")
-        if status_code == HTTPStatus.TOO_MANY_REQUESTS:
-            # 429 Quota exceeded / rate limit hit.
-            raise UpstreamServiceError("IP provider rate limit or quota exceeded (HTTP 429).")
+        error_factory = _HTTP_ERROR_FACTORIES.get(status_code)
+        if error_factory:
+            raise error_factory(response)
+
         if status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
             # 5xx – upstream service failure.
             raise UpstreamServiceError(f"IP provider returned HTTP {status_code}: {response.text}")
 
-        if status_code == HTTPStatus.NOT_FOUND:
-            # 404 URL Not Found (e.g. malformed endpoint).
-            raise IpNotFoundError("No geolocation information found for this IP address.")
-
-    def _handle_provider_error(self, data: dict[str, Any]) -> None:
-        """Normalize provider-specific error payloads into domain exceptions.
+    @staticmethod
+    def _provider_error(data: dict[str, Any]) -> IpProviderError:
+        """Translate a provider-specific error payload into a domain exception.
 
         ipapi.co embeds error information in the JSON body, sometimes with HTTP 200.
         Examples:
@@ -86,51 +128,44 @@ class IpApiCo(BaseIPLookupClient):
             { "error": true, "reason": "RateLimited", "message": "..." }
             { "error": true, "reason": "Quota exceeded", "message": "..." }
         """
-        if not data.get("error"):
-            return
-
         reason = str(data.get("reason") or data.get("message") or "Unknown error from ipapi.co")
-        lower_reason = reason.lower()
 
-        # Syntactically invalid IP.
-        if "invalid ip address" in lower_reason or "invalid" in lower_reason:
-            raise InvalidIpError(reason)
+        kind = _KNOWN_REASONS.get(reason.strip().lower())
+        if kind is None:
+            matched = {match.lastgroup for match in _ERROR_REASON_RE.finditer(reason)}
+            kind = next((candidate for candidate in _ERROR_FACTORIES if candidate in matched), None)
+        # The explicit `reserved` flag wins over anything but an invalid IP.
+        if kind != "invalid" and data.get("reserved") is True:
+            kind = "reserved"
 
-        # Reserved / private address, e.g. 127.0.0.1, 192.168.x.x.
-        if "reserved ip address" in lower_reason or "reserved" in lower_reason or data.get("reserved") is True:
-            raise ReservedIpError(reason)
-
-        # Rate limiting / quota exceeded signalled via reason or 200 with error.
-        if "ratelimited" in lower_reason or "quota" in lower_reason:
-            raise UpstreamServiceError(f"IP provider rate limit or quota exceeded: {reason}")
+        if kind:
+            return _ERROR_FACTORIES[kind](reason)
 
         # Any other provider-level error is treated as an upstream failure.
-        raise UpstreamServiceError(reason)
+        return UpstreamServiceError(reason)
 
-    @staticmethod
-    def _parse_json(response: httpx.Response) -> dict[str, Any]:
-        try:
-            return response.json()
-        except ValueError as exc:
-            raise UpstreamServiceError(f"Failed to decode IP provider response as JSON: {exc}") from exc
-
-    @staticmethod
-    def _normalize_payload(data: dict[str, Any]) -> IPGeolocationData:
-        """Map ipapi.co's response into our normalized schema.
+    @classmethod
+    def _to_geolocation(cls, data: dict[str, Any]) -> IPGeolocationData:
+        """Check ipapi.co's payload for errors and map it into our normalized schema.
 
-        Latitude/longitude are passed through as-is; the IpGeolocationData
-        model is responsible for coercing them into floats via field validators.
+        Error detection and normalization share a single pass over the payload, with
+        every field read exactly once. Fields are already coerced here, so the model
+        is built with `model_construct` and skips a second round of validation.
         """
-        return IPGeolocationData(
-            ip=str(data.get("ip") or ""),
-            country=str(data.get("country") or ""),
-            country_name=str(data.get("country_name") or ""),
-            region=data.get("region"),
-            city=data.get("city"),
-            postal_code=data.get("postal"),
-            latitude=data.get("latitude"),
-            longitude=data.get("longitude"),
-            timezone=data.get("timezone"),
+        get = data.get
+        if get("error"):
+            raise cls._provider_error(data)
+
+        return IPGeolocationData.model_construct(
+            ip=str(get("ip") or ""),
+            country=str(get("country") or ""),
+            country_name=str(get("country_name") or ""),
+            region=get("region"),
+            city=get("city"),
+            postal_code=get("postal"),
+            latitude=coerce_coordinate(get("latitude")),
+            longitude=coerce_coordinate(get("longitude")),
+            timezone=get("timezone"),
             # ipapi.co exposes organisation/ISP information via the "org" field.
-            isp=data.get("org"),
+            isp=get("org"),
         )
@@ -1,36 +1,89 @@
+import asyncio
+import re
+from collections.abc import Callable, Sequence
 from http import HTTPStatus
 from typing import Any
 
 import httpx
-
-from src.clients.base import BaseIPLookupClient
-from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
-from src.models.common import IPGeolocationData
-
-
-class IpApiCom(BaseIPLookupClient):
+import orjson
+
+from src.clients.http import parse_json_response
+from src.errors import InvalidIpError, IpNotFoundError, IpProviderError, ReservedIpError, UpstreamServiceError
+from src.models.common import IPGeolocationData, coerce_coordinate
+
+# The documented ip-api.com failure messages, keyed by their normalized text. Most
+# failures hit this table with a single hash probe.
+_KNOWN_MESSAGES: dict[str, str] = {
+    "invalid query": "invalid",
+    "private range": "reserved",
+    "reserved range": "reserved",
+}
+
+# Fallback for undocumented messages: every keyword found in a single scan is collected,
+# and the first of them in `_ERROR_FACTORIES` order selects the domain exception.
+_ERROR_MESSAGE_RE = re.compile(
+    r"(?P<invalid>invalid)|(?P<reserved>private range|reserved range)|(?P<rate_limit>quota|limit)|(?P<not_found>not found)",
+    re.IGNORECASE,
+)
+
+# Listed in priority order, used when a message matches more than one kind.
+_ERROR_FACTORIES: dict[str, Callable[[str], IpProviderError]] = {
+    "invalid": InvalidIpError,
+    "reserved": ReservedIpError,
+    "rate_limit": lambda message: UpstreamServiceError(f"IP provider rate limit or quota exceeded: {message}"),
+    "not_found": IpNotFoundError,
+}
+
+# ip-api.com's `/batch` endpoint accepts at most this many queries per request.
+BATCH_MAX_SIZE = 100
+
+# HTTP error codes with a dedicated meaning, mapped to the domain error they signal.
+_HTTP_ERROR_FACTORIES: dict[int, Callable[[httpx.Response], IpProviderError]] = {
+    HTTPStatus.NOT_FOUND: lambda _: IpNotFoundError("No geolocation information found for this IP address."),
+    # 429 Quota exceeded / rate limit hit.
+    HTTPStatus.TOO_MANY_REQUESTS: lambda _: UpstreamServiceError(
+        "IP provider rate limit or quota exceeded (HTTP 429)."
+    ),
+}
+
+
+class IpApiCom:
     """Client for the http://ip-api.com JSON API.
 
     This client is intentionally minimal and focused on the subset of fields
     we expose via our own API, providing a normalized shape that decouples
     the rest of the application from the third-party response format.
+
+    The underlying `httpx.AsyncClient` is injected and owned by the caller (the
+    application lifespan), so connections are pooled and reused across lookups. It
+    must be configured with `base_url=DEFAULT_BASE_URL`; requests use relative paths.
     """
 
-    def __init__(self, base_url: str = "http://ip-api.com", timeout_seconds: float = 5.0) -> None:
-        self._base_url = base_url.rstrip("/")
-        self._timeout_seconds = timeout_seconds
+    DEFAULT_BASE_URL = "http://ip-api.com"
+
+    def __init__(self, http_client: httpx.AsyncClient) -> None:
+        self._http_client = http_client
 
     async def lookup_ip(self, ip: str) -> IPGeolocationData:
         """Look up geolocation information for an explicit IP address."""
-        url = f"{self._base_url}/json/{ip}"
-        return await self._request(url)
+        return await self._request("/json/" + ip)
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        """Look up several IP addresses through ip-api.com's native `/batch` endpoint.
+
+        Each chunk of up to `BATCH_MAX_SIZE` IPs costs a single HTTP request. Per-IP
+        failures are returned in place; if a request fails as a whole, every IP in its
+        chunk gets the same error.
+        """
+        chunks = [ips[start : start + BATCH_MAX_SIZE] for start in range(0, len(ips), BATCH_MAX_SIZE)]
+        chunk_results = await asyncio.gather(*(self._request_batch(chunk) for chunk in chunks))
+        return [outcome for results in chunk_results for outcome in results]
 
     async def lookup_client_ip(self) -> IPGeolocationData:
         """Look up geolocation information for the calling client IP."""
-        url = f"{self._base_url}/json/"
-        return await self._request(url)
+        return await self._request("/json/")
 
-    async def _request(self, url: str) -> IPGeolocationData:
+    async def _request(self, path: str) -> IPGeolocationData:
         """Perform the HTTP request and normalize the response.
 
         The ip-api.com API returns a JSON payload with a `status` field that can
@@ -38,87 +91,102 @@ class IpApiCom(BaseIPLookupClient):
         stable response shape.
         """
         try:
-            async with httpx.AsyncClient(timeout=self._timeout_seconds) as client:
-                response = await client.get(url)
+            response = await self._http_client.get(path)
         except httpx.RequestError as exc:
             raise UpstreamServiceError(f"Request to IP provider failed: {repr(exc)}") from exc
 
-        self._handle_http_errors(response)
+        # The overwhelmingly common 200 OK needs no status mapping at all.
+        if response.status_code != HTTPStatus.OK:
+            self._handle_http_errors(response)
+
+        return self._to_geolocation(parse_json_response(response))
 
-        data = self._parse_json(response)
-        self._handle_provider_status(data)
+    async def _request_batch(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        """Look up one chunk of IPs with a single `/batch` request."""
+        try:
+            response = await self._http_client.post(
+                "/batch", content=orjson.dumps(list(ips)), headers={"Content-Type": "application/json"}
+            )
+        except httpx.RequestError as exc:
+            error: IpProviderError = UpstreamServiceError(f"Request to IP provider failed: {repr(exc)}")
+            return [error] * len(ips)
 
-        return self._normalize_payload(data)
+        try:
+            if response.status_code != HTTPStatus.OK:
+                self._handle_http_errors(response)
+            items = parse_json_response(response)
+            if not isinstance(items, list) or len(items) != len(ips):
+                raise UpstreamServiceError("IP provider returned an unexpected batch response.")
+        except IpProviderError as exc:
+            return [exc] * len(ips)
+
+        outcomes: list[IPGeolocationData | IpProviderError] = []
+        for item in items:
+            if not isinstance(item, dict):
+                # A malformed element fails only its own slot, not the whole batch.
+                outcomes.append(UpstreamServiceError("IP provider returned an unexpected batch response."))
+                continue
+            try:
+                outcomes.append(self._to_geolocation(item))
+            except IpProviderError as exc:
+                outcomes.append(exc)
+        return outcomes
 
     def _handle_http_errors(self, response: httpx.Response) -> None:
         """Map HTTP status codes from the provider to domain-specific errors."""
         status_code = response.status_code
 
-        if status_code == HTTPStatus.NOT_FOUND:
-            raise IpNotFoundError("No geolocation information found for this IP address.")
+        error_factory = _HTTP_ERROR_FACTORIES.get(status_code)
+        if error_factory:
+            raise error_factory(response)
 
-        if status_code == HTTPStatus.TOO_MANY_REQUESTS:
-            # 429 Quota exceeded / rate limit hit.
-            raise UpstreamServiceError("IP provider rate limit or quota exceeded (HTTP 429).")
-
-        if HTTPStatus.BAD_REQUEST <= status_code < HTTPStatus.INTERNAL_SERVER_ERROR:
-            # 4xx responses (except 404/429) are treated as upstream errors.
-            raise UpstreamServiceError(f"IP provider returned HTTP {status_code}: {response.text}")
-
-        if status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
-            # 5xx – upstream service failure.
+        if status_code >= HTTPStatus.BAD_REQUEST:
+            # Any other 4xx and all 5xx responses are treated as upstream errors.
             raise UpstreamServiceError(f"IP provider returned HTTP {status_code}: {response.text}")
 
-    def _handle_provider_status(self, data: dict[str, Any]) -> None:
-        """Normalize ip-api.com status/message into domain exceptions."""
-        status_value = str(data.get("status") or "").lower()
-
-        if status_value == "success":
-            return
-
-        # status is "fail" or unknown
+    @staticmethod
+    def _provider_error(data: dict[str, Any]) -> IpProviderError:
+        """Translate an ip-api.com failure status/message into a domain exception."""
         message = str(data.get("message") or "Unknown error from ip-api.com")
-        lower_msg = message.lower()
 
-        if "invalid query" in lower_msg or "invalid" in lower_msg:
-            raise InvalidIpError(message)
+        kind = _KNOWN_MESSAGES.get(message.strip().lower())
+        if kind is None:
+            matched = {match.lastgroup for match in _ERROR_MESSAGE_RE.finditer(message)}
+            kind = next((candidate for candidate in _ERROR_FACTORIES if candidate in matched), None)
 
-        if "private range" in lower_msg or "reserved range" in lower_msg:
-            raise ReservedIpError(message)
+        if kind:
+            return _ERROR_FACTORIES[kind](message)
 
-        if "quota" in lower_msg or "limit" in lower_msg:
-            raise UpstreamServiceError(f"IP provider rate limit or quota exceeded: {message}")
+        return UpstreamServiceError(message)
 
-        if "not found" in lower_msg:
-            raise IpNotFoundError(message)
+    @classmethod
+    def _to_geolocation(cls, data: dict[str, Any]) -> IPGeolocationData:
+        """Check ip-api.com's status and map the payload into our normalized schema.
 
-        raise UpstreamServiceError(message)
+        Status handling and normalization share a single pass over the payload, with
+        every field read exactly once. Fields are already coerced here, so the model
+        is built with `model_construct` and skips a second round of validation.
+        """
+        get = data.get
+        status_value = get("status")
 
-    @staticmethod
-    def _parse_json(response: httpx.Response) -> dict[str, Any]:
-        try:
-            return response.json()
-        except ValueError as exc:
-            raise UpstreamServiceError(f"Failed to decode IP provider response as JSON: {exc}") from exc
+        # Check the exact documented value first so the happy path does no string work.
+        if status_value != "success" and str(status_value or "").lower() != "success":
+            # status is "fail" or unknown
+            raise cls._provider_error(data)
 
-    @staticmethod
-    def _normalize_payload(data: dict[str, Any]) -> IPGeolocationData:
-        """Map ip-api.com's response into our normalized schema."""
-        region_name = data.get("regionName") or data.get("region") or ""
-        region = str(region_name) or None
-
-        postal = str(data.get("zip") or "")
-        postal_code = postal or None
-
-        return IPGeolocationData(
-            ip=str(data.get("query") or ""),
-            country=str(data.get("countryCode") or ""),
-            country_name=str(data.get("country") or ""),
+        region = str(get("regionName") or get("region") or "") or None
+        postal_code = str(get("zip") or "") or None
+
+        return IPGeolocationData.model_construct(
+            ip=str(get("query") or ""),
+            country=str(get("countryCode") or ""),
+            country_name=str(get("country") or ""),
             region=region,
-            city=data.get("city"),
+            city=get("city"),
             postal_code=postal_code,
-            latitude=data.get("lat"),
-            longitude=data.get("lon"),
-            timezone=data.get("timezone"),
-            isp=data.get("isp") or data.get("org"),
+            latitude=coerce_coordinate(get("lat")),
+            longitude=coerce_coordinate(get("lon")),
+            timezone=get("timezone"),
+            isp=get("isp") or get("org"),
         )
@@ -1,3 +1,4 @@
+import logging
 from typing import Any
 
 from fastapi import Request, status
@@ -6,6 +7,12 @@ from pydantic import ValidationError
 
 from src.logger import logger
 
+# Field-specific validation errors, keyed by the last element of the error location.
+# Messages are stable, API-level text instead of the raw Pydantic text.
+_FIELD_VALIDATION_ERRORS: dict[str | int, tuple[str, str]] = {
+    "ip": ("invalid_ip", "The supplied IP address is not a valid IPv4 or IPv6 address."),
+}
+
 
 def _get_provider_from_request(request: Request) -> str | None:
     """Best-effort extraction of the provider value from the incoming request.
@@ -16,19 +23,6 @@ def _get_provider_from_request(request: Request) -> str | None:
     return request.query_params.get("provider")
 
 
-def _normalize_pydantic_errors(errors: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    """Make sure Pydantic error dicts are JSON-serializable."""
-    normalized: list[dict[str, Any]] = []
-    for error in errors:
-        e = dict(error)
-        ctx = e.get("ctx")
-        if isinstance(ctx, dict):
-            # Convert any non-serializable ctx values (e.g. exceptions) to strings.
-            e["ctx"] = {k: str(v) for k, v in ctx.items()}
-        normalized.append(e)
-    return normalized
-
-
 def _build_validation_error_payload(exc: ValidationError) -> dict:
     """Normalize validation errors into a consistent error payload.
 
@@ -36,35 +30,36 @@ def _build_validation_error_payload(exc: ValidationError) -> dict:
     - `code`: short machine-readable error code.
     - `message`: stable human-readable message.
 
-    Internal validation details are not exposed to clients.
+    Internal validation details are not exposed to clients, so only the error
+    locations are inspected and the raw errors are never copied or normalized.
     """
-    code = "invalid_request"
-    message = "Invalid request parameters"
-
-    errors = _normalize_pydantic_errors(exc.errors())
-
-    for error in errors:
-        loc = error.get("loc", ())
-        # Handle both request-level ("query", "ip") and model-level ("ip") locations.
-        if len(loc) >= 1 and loc[-1] == "ip":
-            code = "invalid_ip"
-            # Use a stable, API-level message instead of the raw Pydantic text.
-            message = "The supplied IP address is not a valid IPv4 or IPv6 address."
-            break
+    # Match on the last location element to handle both request-level ("query", "ip")
+    # and model-level ("ip") locations; the first mapped field wins.
+    for error in exc.errors(include_url=False, include_context=False, include_input=False):
+        loc = error["loc"]
+        mapped = _FIELD_VALIDATION_ERRORS.get(loc[-1]) if loc else None
+        if mapped is not None:
+            code, message = mapped
+            return {"code": code, "message": message}
 
     return {
-        "code": code,
-        "message": message,
+        "code": "invalid_request",
+        "message": "Invalid request parameters",
     }
 
 
 async def pydantic_validation_exception_handler(request: Request, exc: ValidationError) -> JSONResponse:
     """Handle Pydantic validation errors raised during dependency resolution."""
     provider = _get_provider_from_request(request)
-    logger.info(
-        "Pydantic validation error during request handling "
-        f"path={request.url.path} method={request.method} provider={provider} errors={exc.errors()}"
-    )
+    # exc.errors() materializes the full error list, so skip it when INFO is disabled.
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Pydantic validation error during request handling path=%s method=%s provider=%s errors=%s",
+            request.url.path,
+            request.method,
+            provider,
+            exc.errors(),
+        )
     payload = _build_validation_error_payload(exc)
     payload["provider"] = provider
     return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=payload)
@@ -74,8 +69,11 @@ async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONR
     """Catch-all handler for unexpected errors to return a structured 500 response."""
     provider = _get_provider_from_request(request)
     logger.exception(
-        "Unhandled exception while processing request: "
-        f"{repr(exc)} path={request.url.path} method={request.method} provider={provider}"
+        "Unhandled exception while processing request: %r path=%s method=%s provider=%s",
+        exc,
+        request.url.path,
+        request.method,
+        provider,
     )
     content: dict[str, Any] = {
         "code": "internal_error",
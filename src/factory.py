@@ -0,0 +1,43 @@
+from collections.abc import Callable, Mapping
+
+import httpx
+
+from src.clients.base import BaseIPLookupClient
+from src.clients.caching import CachingIPLookupClient, TTLCache
+from src.clients.ip_api_co_client import IpApiCo
+from src.clients.ip_api_com_client import IpApiCom
+from src.errors import IpProviderError
+from src.models.common import IPGeolocationData
+from src.models.request_models import Provider
+
+
+class IpLookupProviderFactory:
+    """Factory for IP lookup provider clients.
+
+    Given a Provider enum, returns that provider's long-lived client instance. One
+    factory is built per process at startup, so resolving a client is a dict lookup.
+    """
+
+    PROVIDERS_MAP: dict[Provider, Callable[[httpx.AsyncClient], BaseIPLookupClient]] = {
+        Provider.ipapi_co: IpApiCo,
+        Provider.ip_api_com: IpApiCom,
+    }
+
+    def __init__(self, clients: Mapping[Provider, BaseIPLookupClient]) -> None:
+        self._clients = clients
+
+    def __call__(self, provider: Provider) -> BaseIPLookupClient:
+        return self._clients[provider]
+
+    @classmethod
+    def from_http_clients(cls, http_clients: Mapping[Provider, httpx.AsyncClient]) -> "IpLookupProviderFactory":
+        """Build every provider client over its shared HTTP client, each behind its own lookup cache."""
+        return cls(
+            {
+                provider: CachingIPLookupClient(
+                    cls.PROVIDERS_MAP[provider](http_client),
+                    TTLCache[IPGeolocationData | IpProviderError](),
+                )
+                for provider, http_client in http_clients.items()
+            }
+        )
@@ -1,53 +1,157 @@
+import logging
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+import orjson
+from fastapi import Depends, FastAPI, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from pydantic import ValidationError
 
-from src.clients.base import BaseIPLookupClient
+from src.clients.http import create_http_client
 from src.clients.ip_api_co_client import IpApiCo, IPGeolocationData
 from src.clients.ip_api_com_client import IpApiCom
-from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
+from src.errors import InvalidIpError, IpNotFoundError, IpProviderError, ReservedIpError, UpstreamServiceError
 from src.exception_handlers import (
     pydantic_validation_exception_handler,
     unhandled_exception_handler,
 )
+from src.factory import IpLookupProviderFactory
 from src.logger import logger
-from src.models.request_models import IPLookupRequest, Provider
-from src.models.response_models import HealthResponse, IPLookupResponse
+from src.models.request_models import BatchIPLookupRequest, IPLookupRequest, Provider, is_ip_address, is_reserved_ip
+from src.models.response_models import BatchIPLookupResponse, HealthResponse, IPLookupResponse
+from src.response_cache import ResponseCache, create_response_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create shared resources on startup and release them on shutdown.
+
+    Each upstream provider gets one long-lived `httpx.AsyncClient` so that TCP/TLS
+    connections are pooled and kept alive between lookups instead of being
+    re-established for every request. Each provider client is built once and wrapped
+    with its own lookup cache, which lives as long as the app (one per worker process).
+    When `REDIS_URL` is set, a Redis-backed response cache shared by all workers is
+    opened as well.
+    """
+    # Each resource is registered for cleanup as soon as it exists, so a failure while
+    # creating a later one (e.g. a bad REDIS_URL) still closes the earlier ones.
+    async with AsyncExitStack() as stack:
+        app.state.http_clients = {
+            Provider.ipapi_co: await stack.enter_async_context(create_http_client(IpApiCo.DEFAULT_BASE_URL)),
+            Provider.ip_api_com: await stack.enter_async_context(create_http_client(IpApiCom.DEFAULT_BASE_URL)),
+        }
+        app.state.ip_lookup_provider_factory = IpLookupProviderFactory.from_http_clients(app.state.http_clients)
+        app.state.response_cache = create_response_cache()
+        if app.state.response_cache is not None:
+            stack.push_async_callback(app.state.response_cache.aclose)
+        logger.info("Started IP Geolocation Service")
+        yield
+
 
 app = FastAPI(
     title="IP Geolocation Service",
     version="0.1.0",
     description="IP geolocation microservice for the take-home test.",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    # Global exception handlers from the shared handlers module.
+    exception_handlers={
+        ValidationError: pydantic_validation_exception_handler,
+        Exception: unhandled_exception_handler,
+    },
 )
-logger.info("Started IP Geolocation Service")
 
 
-# TODO: move to the separate factory.py file
-class IpLookupProviderFactory:
-    """Factory for IP lookup provider clients.
+async def get_ip_lookup_request(ip: str | None = None, provider: Provider = Provider.ipapi_co) -> IPLookupRequest:
+    """Dependency to build the validated IPLookupRequest from the query parameters.
 
-    Given a Provider enum, returns a concrete client instance.
+    Equivalent to `Depends()` on the model class, but declared async: FastAPI runs sync
+    dependencies, including model classes, in the threadpool on every request.
     """
+    return IPLookupRequest(ip=ip, provider=provider)
+
+
+async def get_ip_lookup_provider_factory(request: Request) -> IpLookupProviderFactory:
+    """Dependency to provide the app-wide IpLookupProviderFactory built in `lifespan`.
+
+    Declared async so FastAPI resolves it on the event loop instead of dispatching a
+    trivial attribute lookup to the threadpool.
+    """
+    return request.app.state.ip_lookup_provider_factory
+
+
+async def get_response_cache(request: Request) -> ResponseCache | None:
+    """Dependency to provide the shared Redis response cache, or None when it is disabled."""
+    return request.app.state.response_cache
+
+
+# Load balancers poll /health constantly; the body never changes, so serialize it once.
+# `response_model` stays on the route to document the shape.
+_HEALTH_RESPONSE = Response(
+    content=HealthResponse(status="ok").model_dump_json(),
+    media_type="application/json",
+)
+
+# The lookup response is `{"provider": ..., **geolocation fields}`; the provider part
+# is fixed per provider, so it is encoded once and spliced in front of the data.
+_LOOKUP_RESPONSE_PREFIXES: dict[Provider, bytes] = {
+    provider: b'{"provider":' + orjson.dumps(provider.value) + b"," for provider in Provider
+}
+
+
+def _serialize_lookup_response(provider: Provider, data: IPGeolocationData) -> bytes:
+    """Encode an IPLookupResponse body without copying the data into a new dict."""
+    return _LOOKUP_RESPONSE_PREFIXES[provider] + orjson.dumps(data.__dict__)[1:]
+
+
+async def _answer_without_upstream(
+    ip: str, provider: Provider, response_cache: ResponseCache | None
+) -> Response | None:
+    """Answer an explicit-IP lookup locally if possible: reserved IPs and cache hits."""
+    if is_reserved_ip(ip):
+        logger.info("Rejected reserved/private IP without upstream lookup ip=%s provider=%s", ip, provider.value)
+        return _error_response(status.HTTP_400_BAD_REQUEST, _RESERVED_IP_BODIES[provider])
+
+    if response_cache is not None:
+        cached = await response_cache.get(provider, ip)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+
+    return None
+
 
-    PROVIDERS_MAP: dict[Provider, type[BaseIPLookupClient]] = {
-        Provider.ipapi_co: IpApiCo,
-        Provider.ip_api_com: IpApiCom,
-    }
+# Error codes reported per IP by the batch endpoint; these match the codes returned by
+# the single lookup endpoint for the same provider errors.
+_BATCH_ERROR_CODES: dict[type[IpProviderError], str] = {
+    InvalidIpError: "invalid_ip",
+    ReservedIpError: "reserved_ip",
+    IpNotFoundError: "ip_not_found",
+}
+_INVALID_IP_MESSAGE = "The supplied IP address is not a valid IPv4 or IPv6 address."
+_RESERVED_IP_MESSAGE = "The supplied IP address is in a reserved or private range."
 
-    def __call__(self, provider: Provider) -> BaseIPLookupClient:
-        client_cls = self.PROVIDERS_MAP[provider]
-        return client_cls()
 
+def _lookup_error_body(code: str, message: str, provider: Provider) -> bytes:
+    """Serialize a lookup error body in the same `{"detail": {...}}` shape as an HTTPException."""
+    return orjson.dumps({"detail": {"code": code, "message": message, "provider": provider}})
 
-def get_ip_lookup_provider_factory() -> IpLookupProviderFactory:
-    """Dependency to provide an IpLookupProviderFactory instance."""
-    return IpLookupProviderFactory()
 
+# Local reserved-IP rejections always carry the same message, so their bodies are encoded
+# once per provider. Provider error messages embed upstream text and are encoded per response.
+_RESERVED_IP_BODIES: dict[Provider, bytes] = {
+    provider: _lookup_error_body("reserved_ip", _RESERVED_IP_MESSAGE, provider) for provider in Provider
+}
 
-# Register global exception handlers using the shared handlers module.
-app.add_exception_handler(ValidationError, pydantic_validation_exception_handler)
-app.add_exception_handler(Exception, unhandled_exception_handler)
+
+def _lookup_error_response(status_code: int, code: str, message: str, provider: Provider) -> Response:
+    """Build a lookup error response for a provider error."""
+    return _error_response(status_code, _lookup_error_body(code, message, provider))
+
+
+def _error_response(status_code: int, body: bytes) -> Response:
+    """Wrap an already-encoded JSON error body in a response."""
+    return Response(content=body, status_code=status_code, media_type="application/json")
 
 
 @app.get(
@@ -57,9 +161,9 @@ app.add_exception_handler(Exception, unhandled_exception_handler)
     status_code=status.HTTP_200_OK,
     summary="Health check",
 )
-async def health() -> HealthResponse:
+async def health() -> Response:
     """Basic health check endpoint."""
-    return HealthResponse(status="ok")
+    return _HEALTH_RESPONSE
 
 
 @app.get(
@@ -71,106 +175,151 @@ async def health() -> HealthResponse:
 )
 async def ip_lookup(
     request: Request,
-    query: Annotated[IPLookupRequest, Depends()],
+    query: Annotated[IPLookupRequest, Depends(get_ip_lookup_request)],
     provider_factory: Annotated[IpLookupProviderFactory, Depends(get_ip_lookup_provider_factory)],
-) -> IPLookupResponse:
+    response_cache: Annotated[ResponseCache | None, Depends(get_response_cache)],
+) -> Response:
     """Look up geolocation information for either a specific IP or the caller's IP.
 
     - If `query.ip` is provided, that IP is used.
     - Otherwise, the client's IP is inferred from the request (e.g. `request.client.host`).
     - If `query.provider` is provided, it selects which upstream provider to use.
       If omitted, ipapi.co is used by default.
+
+    Reserved/private IPs are rejected locally without an upstream request, and explicit
+    IP lookups are served from the Redis response cache when it is enabled.
     """
     ip = query.ip
     provider = query.provider
+
+    if ip:
+        local_response = await _answer_without_upstream(ip, provider, response_cache)
+        if local_response is not None:
+            return local_response
+
     ip_lookup_client = provider_factory(provider)
 
     try:
         if ip:
             logger.info(
-                "Performing explicit IP lookup "
-                f"path={request.url.path} method={request.method} ip={ip} "
-                f"provider={provider}"
+                "Performing explicit IP lookup path=%s method=%s ip=%s provider=%s",
+                request.url.path,
+                request.method,
+                ip,
+                provider.value,
             )
             data: IPGeolocationData = await ip_lookup_client.lookup_ip(ip)
         else:
-            # Automatically detect the client's IP address from the request.
-            client_host = request.client.host if request.client else None
-            x_forwarded_for = request.headers.get("x-forwarded-for")
-            logger.info(
-                "Performing client IP lookup "
-                f"path={request.url.path} method={request.method} "
-                f"client_ip={client_host} x_forwarded_for={x_forwarded_for} "
-                f"provider={provider}"
-            )
+            # The client address and forwarding header are only used for logging.
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "Performing client IP lookup path=%s method=%s client_ip=%s x_forwarded_for=%s provider=%s",
+                    request.url.path,
+                    request.method,
+                    request.client.host if request.client else None,
+                    request.headers.get("x-forwarded-for"),
+                    provider.value,
+                )
             # For simplicity, rely on the provider's automatic client IP detection.
             # In a real deployment behind a proxy/load balancer you would typically
             # also inspect X-Forwarded-For or similar headers more carefully.
             data = await ip_lookup_client.lookup_client_ip()
     except InvalidIpError as exc:
         logger.error(
-            "Invalid IP error during lookup "
-            f"path={request.url.path} method={request.method} ip={ip} provider={provider} error={exc}"
+            "Invalid IP error during lookup path=%s method=%s ip=%s provider=%s error=%s",
+            request.url.path,
+            request.method,
+            ip,
+            provider.value,
+            exc,
         )
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail={
-                "code": "invalid_ip",
-                "message": str(exc),
-                "provider": provider,
-            },
-        ) from exc
+        return _lookup_error_response(status.HTTP_400_BAD_REQUEST, "invalid_ip", str(exc), provider)
     except ReservedIpError as exc:
         logger.error(
-            "Reserved/private IP used for lookup "
-            f"path={request.url.path} method={request.method} ip={ip} provider={provider} error={exc}"
+            "Reserved/private IP used for lookup path=%s method=%s ip=%s provider=%s error=%s",
+            request.url.path,
+            request.method,
+            ip,
+            provider.value,
+            exc,
         )
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail={
-                "code": "reserved_ip",
-                "message": str(exc),
-                "provider": provider,
-            },
-        ) from exc
+        return _lookup_error_response(status.HTTP_400_BAD_REQUEST, "reserved_ip", str(exc), provider)
     except IpNotFoundError as exc:
         logger.error(
-            "No geolocation information found for IP "
-            f"path={request.url.path} method={request.method} ip={ip} provider={provider} error={exc}"
+            "No geolocation information found for IP path=%s method=%s ip=%s provider=%s error=%s",
+            request.url.path,
+            request.method,
+            ip,
+            provider.value,
+            exc,
         )
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail={
-                "code": "ip_not_found",
-                "message": str(exc),
-                "provider": provider,
-            },
-        ) from exc
+        return _lookup_error_response(status.HTTP_404_NOT_FOUND, "ip_not_found", str(exc), provider)
     except UpstreamServiceError as exc:
         logger.exception(
-            "Upstream IP provider error during lookup "
-            f"path={request.url.path} method={request.method} ip={ip} provider={provider} error={exc}"
+            "Upstream IP provider error during lookup path=%s method=%s ip=%s provider=%s error=%s",
+            request.url.path,
+            request.method,
+            ip,
+            provider.value,
+            exc,
         )
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail={
-                "code": "upstream_error",
-                "message": str(exc),
-                "provider": provider,
-            },
-        ) from exc
-
-    # Map IpGeolocationData to the outward-facing response model.
-    return IPLookupResponse(
-        provider=provider,
-        ip=data.ip,
-        country=data.country,
-        country_name=data.country_name,
-        region=data.region,
-        city=data.city,
-        postal_code=data.postal_code,
-        latitude=data.latitude,
-        longitude=data.longitude,
-        timezone=data.timezone,
-        isp=data.isp,
-    )
+        return _lookup_error_response(status.HTTP_502_BAD_GATEWAY, "upstream_error", str(exc), provider)
+
+    # Map IpGeolocationData to the outward-facing IPLookupResponse shape. The data was
+    # already normalized by the provider client, so encode it straight to JSON instead of
+    # building and re-validating a response model; response_model only documents the shape.
+    body = _serialize_lookup_response(provider, data)
+    if ip and response_cache is not None:
+        response_cache.set_in_background(provider, ip, body)
+    return Response(content=body, media_type="application/json")
+
+
+@app.post(
+    "/v1/ip/lookup:batch",
+    response_model=BatchIPLookupResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["ip"],
+    summary="Look up geolocation information for several IP addresses.",
+)
+async def ip_lookup_batch(
+    body: BatchIPLookupRequest,
+    provider_factory: Annotated[IpLookupProviderFactory, Depends(get_ip_lookup_provider_factory)],
+) -> Response:
+    """Look up geolocation information for up to 100 IP addresses in one request.
+
+    Lookups run concurrently (or as a native upstream batch, where the provider has one)
+    and results are returned in request order. A failure for one IP is reported in its
+    slot with the same `code` values as the single lookup endpoint; it does not fail the batch.
+
+    Unlike the single lookup endpoint, a body that fails validation as a whole (not a JSON
+    object, an empty list or more than 100 IPs, an entry longer than 45 characters, an
+    unknown `provider`) is rejected by FastAPI with its default 422 response, not a 400 in
+    the service's `{code, message, provider}` shape. Malformed IPs are not such failures:
+    they are reported per slot as `invalid_ip`.
+    """
+    provider = body.provider
+    outcomes: dict[str, IPGeolocationData | IpProviderError] = {}
+    lookup_ips: list[str] = []
+    for ip in dict.fromkeys(body.ips):
+        if not is_ip_address(ip):
+            continue
+        if is_reserved_ip(ip):
+            outcomes[ip] = ReservedIpError(_RESERVED_IP_MESSAGE)
+        else:
+            lookup_ips.append(ip)
+
+    logger.info("Performing batch IP lookup size=%s provider=%s", len(body.ips), provider.value)
+    if lookup_ips:
+        outcomes.update(zip(lookup_ips, await provider_factory(provider).lookup_ips(lookup_ips), strict=True))
+
+    results: list[dict[str, object]] = []
+    for ip in body.ips:
+        outcome = outcomes.get(ip)
+        if outcome is None:
+            results.append({"ip": ip, "code": "invalid_ip", "message": _INVALID_IP_MESSAGE, "provider": provider})
+        elif isinstance(outcome, IpProviderError):
+            code = _BATCH_ERROR_CODES.get(type(outcome), "upstream_error")
+            results.append({"ip": ip, "code": code, "message": str(outcome), "provider": provider})
+        else:
+            results.append({"provider": provider, **outcome.__dict__})
+    return ORJSONResponse({"results": results})
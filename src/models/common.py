@@ -3,6 +3,25 @@ from typing import Any
 from pydantic import BaseModel, field_validator
 
 
+def coerce_coordinate(value: Any) -> float | None:
+    """Coerce a latitude/longitude value into a float, or None if missing/invalid.
+
+    Shared by the model validator and by clients that build `IPGeolocationData`
+    via `model_construct`, which skips validation. JSON floats are already at the
+    provider's precision and are returned as-is; only other inputs (e.g. strings)
+    are parsed and rounded.
+    """
+    if value is None:
+        return None
+    if type(value) is float:
+        return value
+    try:
+        # For general GPS and mapping, 5-6 decimal places (e.g., 34.052235)
+        return round(float(value), 6)
+    except (TypeError, ValueError):
+        return None
+
+
 class IPGeolocationData(BaseModel):
     """Normalized geolocation data returned by an IP provider.
 
@@ -30,10 +49,4 @@ class IPGeolocationData(BaseModel):
         Providers may return these fields as strings; this validator normalizes them
         into floats while gracefully handling missing or invalid values.
         """
-        if value is None:
-            return None
-        try:
-            # For general GPS and mapping, 5-6 decimal places (e.g., 34.052235)
-            return round(float(value), 6)
-        except (TypeError, ValueError):
-            return None
+        return coerce_coordinate(value)
@@ -1,7 +1,62 @@
+import socket
 from enum import Enum
-from ipaddress import AddressValueError, ip_address
+from functools import lru_cache
+from ipaddress import IPv6Address, ip_address
+from typing import Annotated
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, StringConstraints, field_validator
+
+# Characters that can appear in an IPv4/IPv6 literal; anything else is rejected up front.
+_IP_CHARS = frozenset("0123456789abcdefABCDEF.:")
+# Longest textual IP literal, e.g. "ffff:ffff:ffff:ffff:ffff:ffff:255.255.255.255".
+MAX_IP_LENGTH = 45
+
+
+def is_ip_address(value: str) -> bool:
+    """Return True if `value` is a valid IPv4 or IPv6 literal.
+
+    Over-long strings are rejected before the memoized check, so the cache only ever
+    holds short keys.
+    """
+    return len(value) <= MAX_IP_LENGTH and _is_ip_literal(value)
+
+
+@lru_cache(maxsize=4096)
+def _is_ip_literal(value: str) -> bool:
+    """Check an IP literal of bounded length; results for hot IPs are memoized.
+
+    Uses the C-level `socket.inet_pton` instead of building `ipaddress` objects.
+    """
+    if not _IP_CHARS.issuperset(value):
+        return False
+
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, value)
+        except OSError:
+            continue
+        return True
+    return False
+
+
+@lru_cache(maxsize=4096)
+def is_reserved_ip(value: str) -> bool:
+    """Return True if the (valid) IP literal `value` cannot have a public geolocation.
+
+    Covers private, loopback, link-local, multicast, unspecified and otherwise reserved
+    ranges. IPv4-mapped IPv6 addresses are judged by their IPv4 address.
+    """
+    address = ip_address(value)
+    if isinstance(address, IPv6Address) and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return (
+        address.is_private
+        or address.is_loopback
+        or address.is_link_local
+        or address.is_multicast
+        or address.is_unspecified
+        or address.is_reserved
+    )
 
 
 class Provider(str, Enum):
@@ -48,9 +103,28 @@ class IPLookupRequest(BaseModel):
         if not value_str:
             return None
 
-        try:
-            ip_address(value_str)
-        except AddressValueError as exc:
-            raise ValueError("ip must be a valid IPv4 or IPv6 address") from exc
+        if not is_ip_address(value_str):
+            raise ValueError("ip must be a valid IPv4 or IPv6 address")
 
         return value_str
+
+
+class BatchIPLookupRequest(BaseModel):
+    """Request body for a batch IP geolocation lookup.
+
+    Every IP is looked up with the same provider. Entries are stripped and capped at the
+    length of the longest IP literal; malformed IPs are reported per item in the
+    response instead of failing the batch.
+    """
+
+    ips: list[Annotated[str, StringConstraints(strip_whitespace=True, max_length=MAX_IP_LENGTH)]] = Field(
+        min_length=1,
+        max_length=100,
+        description="IPv4 or IPv6 addresses to look up (at most 100).",
+        examples=[["8.8.8.8", "2001:4860:4860::8888"]],
+    )
+    provider: Provider = Field(
+        default=Provider.ipapi_co,
+        description="Upstream provider to use for the lookups. Defaults to ipapi.co.",
+        examples=["ipapi.co", "ip-api.com"],
+    )
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 
+from src.models.common import IPGeolocationData
 from src.models.request_models import Provider
 
 
@@ -9,17 +10,25 @@ class HealthResponse(BaseModel):
     status: str
 
 
-class IPLookupResponse(BaseModel):
-    """Response model for IP geolocation lookup."""
+class IPLookupResponse(IPGeolocationData):
+    """Response model for IP geolocation lookup.
+
+    The normalized geolocation fields plus the provider that served the lookup.
+    """
 
     provider: Provider
+
+
+class BatchLookupError(BaseModel):
+    """Per-IP error entry in a batch lookup response."""
+
     ip: str
-    country: str
-    country_name: str
-    region: str | None = None
-    city: str | None = None
-    postal_code: str | None = None
-    latitude: float | None = None
-    longitude: float | None = None
-    timezone: str | None = None
-    isp: str | None = None
+    code: str
+    message: str
+    provider: Provider
+
+
+class BatchIPLookupResponse(BaseModel):
+    """Response model for batch IP geolocation lookup; results are in request order."""
+
+    results: list[IPLookupResponse | BatchLookupError]
@@ -0,0 +1,120 @@
+import asyncio
+import os
+from ipaddress import ip_address
+from typing import Protocol, cast
+
+from src.logger import logger
+from src.models.request_models import Provider
+
+REDIS_URL_ENV = "REDIS_URL"
+RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+RESPONSE_CACHE_KEY_PREFIX = "ipgeo"
+# Size of the Redis connection pool shared by all requests in a worker. When every
+# connection is busy, a request waits up to REDIS_POOL_TIMEOUT_SECONDS for one to be
+# released rather than failing at once, so a burst does not switch the cache off.
+REDIS_MAX_CONNECTIONS = 50
+REDIS_POOL_TIMEOUT_SECONDS = 0.2
+# Redis connect and read timeouts. redis-py waits forever by default, so a hung or
+# unreachable Redis would stall every lookup instead of falling through to the upstream.
+REDIS_SOCKET_TIMEOUT_SECONDS = 0.2
+# Upper bound on write-behind SETEX calls in flight; beyond it (e.g. while Redis is
+# slow or down) new writes are dropped instead of piling up as tasks.
+MAX_PENDING_WRITES = 1000
+
+
+class RedisLike(Protocol):
+    """Subset of the `redis.asyncio.Redis` API used by the response cache."""
+
+    async def get(self, name: str) -> bytes | None: ...
+
+    async def setex(self, name: str, time: int, value: bytes) -> object: ...
+
+    async def aclose(self) -> None: ...
+
+
+class ResponseCache:
+    """Redis-backed cache of serialized `IPLookupResponse` JSON bodies, shared across workers.
+
+    Bodies are stored and returned as raw bytes, so a hit is written to the client
+    without being decoded or re-encoded.
+
+    The cache is an optimization only: any Redis failure is logged and treated as a
+    miss, so lookups fall through to the upstream provider during an outage.
+    """
+
+    def __init__(
+        self,
+        redis: RedisLike,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+        max_pending_writes: int = MAX_PENDING_WRITES,
+    ) -> None:
+        self._redis = redis
+        self._ttl_seconds = ttl_seconds
+        self._max_pending_writes = max_pending_writes
+        self._pending_writes: set[asyncio.Task[None]] = set()
+
+    @staticmethod
+    def key(provider: Provider, ip: str) -> str:
+        """Build the cache key, normalizing the IP so equivalent spellings share an entry."""
+        return f"{RESPONSE_CACHE_KEY_PREFIX}:{provider.value}:{ip_address(ip).exploded}"
+
+    async def get(self, provider: Provider, ip: str) -> bytes | None:
+        """Return the cached response body for `(provider, ip)`, or None on a miss or Redis error."""
+        key = self.key(provider, ip)
+        try:
+            cached = await self._redis.get(key)
+        except Exception:
+            logger.warning("Response cache read failed key=%s", key, exc_info=True)
+            return None
+        return cached
+
+    async def set(self, provider: Provider, ip: str, body: bytes) -> None:
+        """Store the response `body` for `(provider, ip)`; Redis errors are logged and ignored."""
+        key = self.key(provider, ip)
+        try:
+            await self._redis.setex(key, self._ttl_seconds, body)
+        except Exception:
+            logger.warning("Response cache write failed key=%s", key, exc_info=True)
+
+    def set_in_background(self, provider: Provider, ip: str, body: bytes) -> None:
+        """Store the response `body` without making the caller wait for Redis (write-behind).
+
+        The write is dropped if too many are already in flight.
+        """
+        if len(self._pending_writes) >= self._max_pending_writes:
+            logger.warning("Response cache write dropped, too many pending writes ip=%s", ip)
+            return
+
+        task = asyncio.create_task(self.set(provider, ip, body))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+
+    async def aclose(self) -> None:
+        """Flush pending writes, then close the underlying Redis connection pool."""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes)
+        await self._redis.aclose()
+
+
+def create_response_cache() -> ResponseCache | None:
+    """Build the response cache from `REDIS_URL`, or return None when it is not configured.
+
+    `redis` is an optional dependency (the `redis` extra) and is only imported when a
+    URL is set.
+    """
+    redis_url = os.getenv(REDIS_URL_ENV)
+    if not redis_url:
+        return None
+
+    from redis.asyncio import BlockingConnectionPool, Redis
+
+    pool = BlockingConnectionPool.from_url(
+        redis_url,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT_SECONDS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT_SECONDS,
+    )
+    # redis-py annotates its commands as returning `Awaitable[Any] | Any` (sync and async
+    # clients share the stubs), so the async client has to be cast to the Protocol.
+    return ResponseCache(cast(RedisLike, Redis.from_pool(pool)))
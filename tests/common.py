@@ -1,51 +1,130 @@
-from http import HTTPStatus
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import InitVar, dataclass
+from functools import cache
 from typing import Any
 
 import httpx
+import orjson
 
+# Base URL of clients built by `mock_http_client`; never contacted, since the transport answers in-process.
+MOCK_BASE_URL = "http://upstream.test"
 
+
+@dataclass(frozen=True, slots=True)
 class MockResponse:
-    def __init__(self, status_code: int, payload: dict[str, Any] | None = None, text: str = "") -> None:
-        self.status_code = status_code
-        self._payload = payload or {}
-        self.text = text
+    """Immutable description of a canned upstream response; safe to share between tests."""
+
+    status_code: int
+    payload: InitVar[dict[str, Any] | list[dict[str, Any]] | None] = None
+    content: bytes | None = None
+
+    def __post_init__(self, payload: dict[str, Any] | list[dict[str, Any]] | None) -> None:
+        if self.content is None:
+            object.__setattr__(self, "content", orjson.dumps(payload or {}))
+
+
+@cache
+def error_response(status_code: int, text: str = "") -> MockResponse:
+    """Return a shared response for `status_code` with a plain-text body, built once per `(status_code, text)`."""
+    return MockResponse(status_code=status_code, content=text.encode())
 
-    def json(self) -> dict[str, Any]:
-        return self._payload
 
+class RecordingTransport(httpx.MockTransport):
+    """In-process transport that answers every request with a canned response and records it.
 
-class MockAsyncClient:
-    """Minimal async context-manager mock for httpx.AsyncClient."""
+    Provider clients are given a real `httpx.AsyncClient` on top of it (see
+    `mock_http_client`), so request building and URL handling follow the production path.
+    """
 
-    def __init__(self, response: MockResponse) -> None:
+    def __init__(self, response: MockResponse | None = None) -> None:
+        super().__init__(self._respond)
         self._response = response
+        self.requested_urls: list[str] = []
+        self.posted_contents: list[bytes] = []
 
-    async def __aenter__(self) -> "MockAsyncClient":
-        return self
+    def respond_with(self, response: MockResponse) -> None:
+        """Serve `response` from now on and forget earlier requests, so one client can be reused."""
+        self._response = response
+        self.requested_urls.clear()
+        self.posted_contents.clear()
 
-    async def __aexit__(self, exc_type, exc, tb) -> None:
-        return None
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        assert self._response is not None, "no response configured"
+        self.requested_urls.append(request.url.raw_path.decode())
+        if request.method == "POST":
+            self.posted_contents.append(request.content)
+        return httpx.Response(self._response.status_code, content=self._response.content)
 
-    async def get(self, url: str) -> MockResponse:
-        return self._response
 
+def _fail(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("Network failure", request=request)
 
-class FailingAsyncClient:
-    """Async client that raises a RequestError on enter to simulate network failure.
 
-    The target URL is provided at construction time, so tests for different providers
-    can reuse this implementation with different base URLs.
-    """
+# Transport that fails every request to simulate a network failure.
+FAILING_TRANSPORT = httpx.MockTransport(_fail)
+
+
+def mock_http_client(transport: httpx.MockTransport) -> httpx.AsyncClient:
+    """Build an `httpx.AsyncClient` that sends its requests to `transport` instead of the network."""
+    return httpx.AsyncClient(transport=transport, base_url=MOCK_BASE_URL)
+
+
+class FakeRedis:
+    """In-memory stand-in for `redis.asyncio.Redis` that can simulate an outage."""
+
+    def __init__(self) -> None:
+        self.store: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+        self.fail = False
+
+    async def get(self, name: str) -> bytes | None:
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.store.get(name)
+
+    async def setex(self, name: str, time: int, value: bytes) -> bool:
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.store[name] = value
+        self.ttls[name] = time
+        return True
+
+    async def aclose(self) -> None:
+        pass
+
+
+@asynccontextmanager
+async def hanging_redis_url() -> AsyncIterator[str]:
+    """Serve a Redis URL whose server accepts connections but never answers, like a hung Redis."""
+
+    async def hold(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_server(hold, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        yield f"redis://127.0.0.1:{port}/0"
 
-    def __init__(self, url: str, *args: Any, **kwargs: Any) -> None:
-        self._url = url
 
-    async def __aenter__(self) -> "FailingAsyncClient":
-        request = httpx.Request("GET", self._url)
-        raise httpx.RequestError("Network failure", request=request)
+@asynccontextmanager
+async def slow_redis_url(delay: float) -> AsyncIterator[str]:
+    """Serve a Redis URL whose server answers every command with a nil reply after `delay` seconds."""
 
-    async def __aexit__(self, exc_type, exc, tb) -> None:
-        return None
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Commands arrive as RESP arrays of bulk strings: `*<n>`, then `$<len>` and the value per argument.
+        while header := await reader.readline():
+            for _ in range(int(header[1:])):
+                length = int((await reader.readline())[1:])
+                await reader.readexactly(length + 2)
+            await asyncio.sleep(delay)
+            writer.write(b"$-1\r\n")
+            await writer.drain()
+        writer.close()
 
-    async def get(self, url: str) -> MockResponse:
-        return MockResponse(status_code=HTTPStatus.OK, payload={})
+    server = await asyncio.start_server(answer, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        yield f"redis://127.0.0.1:{port}/0"
@@ -0,0 +1,36 @@
+from collections.abc import AsyncIterator
+
+import httpx
+import pytest
+from pytest_asyncio import is_async_test
+
+from src.main import app
+from tests.common import FAILING_TRANSPORT, mock_http_client
+
+
+def pytest_collection_modifyitems(items: list[pytest.Item]) -> None:
+    """Run every async test on one session-wide event loop instead of a fresh loop per test."""
+    session_scope_marker = pytest.mark.asyncio(scope="session")
+    for item in items:
+        if is_async_test(item):
+            item.add_marker(session_scope_marker, append=False)
+
+
+@pytest.fixture(scope="session")
+async def failing_http_client() -> AsyncIterator[httpx.AsyncClient]:
+    """HTTP client whose every request fails with a network error; stateless, so shared by all tests."""
+    async with mock_http_client(FAILING_TRANSPORT) as client:
+        yield client
+
+
+@pytest.fixture(scope="session", autouse=True)
+async def _warm_app() -> None:
+    """Send one request through the app before any test runs.
+
+    Starlette builds the middleware stack on the first request and FastAPI builds the
+    OpenAPI schema on the first `/openapi.json` call, so this keeps that one-off cost out
+    of whichever API test happens to run first. The lifespan is not started.
+    """
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/openapi.json")
@@ -0,0 +1,182 @@
+import asyncio
+from collections.abc import Sequence
+
+import pytest
+
+from src.clients.base import lookup_ips_concurrently
+from src.clients.caching import CachingIPLookupClient, TTLCache
+from src.errors import IpNotFoundError, IpProviderError, ReservedIpError
+from src.models.common import IPGeolocationData
+
+
+class _FakeClock:
+    """Manually advanced clock for deterministic expiry tests."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _CountingClient:
+    """Test double for a provider client that records calls and returns a fixed outcome.
+
+    Lookups block until `release` is set, which lets tests pile up concurrent callers.
+    """
+
+    def __init__(self, outcome: IPGeolocationData | Exception) -> None:
+        self._outcome = outcome
+        self.calls: list[str] = []
+        self.batches: list[list[str]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def lookup_ip(self, ip: str) -> IPGeolocationData:
+        self.calls.append(ip)
+        await self.release.wait()
+        if isinstance(self._outcome, Exception):
+            raise self._outcome
+        return self._outcome
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        self.batches.append(list(ips))
+        return await lookup_ips_concurrently(self, ips)
+
+    async def lookup_client_ip(self) -> IPGeolocationData:
+        return await self.lookup_ip("<client>")
+
+
+GEO_DATA = IPGeolocationData(ip="8.8.8.8", country="US", country_name="United States")
+
+
+def _make_client(
+    outcome: IPGeolocationData | Exception,
+) -> tuple[CachingIPLookupClient, _CountingClient, _FakeClock]:
+    clock = _FakeClock()
+    inner = _CountingClient(outcome)
+    cache: TTLCache[IPGeolocationData | IpProviderError] = TTLCache(maxsize=10, clock=clock)
+    client = CachingIPLookupClient(inner, cache, ttl_seconds=60.0, error_ttl_seconds=10.0)
+    return client, inner, clock
+
+
+def test_ttl_cache_evicts_least_recently_used_entry() -> None:
+    cache: TTLCache[int] = TTLCache(maxsize=2, clock=_FakeClock())
+    cache.set("a", 1, ttl_seconds=60.0)
+    cache.set("b", 2, ttl_seconds=60.0)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+
+    cache.set("c", 3, ttl_seconds=60.0)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+async def test_repeated_lookup_is_served_from_cache() -> None:
+    client, inner, _ = _make_client(GEO_DATA)
+
+    first = await client.lookup_ip("8.8.8.8")
+    second = await client.lookup_ip("8.8.8.8")
+
+    assert first == second == GEO_DATA
+    assert inner.calls == ["8.8.8.8"]
+
+
+async def test_cached_lookup_expires_after_ttl() -> None:
+    client, inner, clock = _make_client(GEO_DATA)
+
+    await client.lookup_ip("8.8.8.8")
+    clock.now = 61.0
+    await client.lookup_ip("8.8.8.8")
+
+    assert inner.calls == ["8.8.8.8", "8.8.8.8"]
+
+
+async def test_reserved_ip_error_is_cached_with_shorter_ttl() -> None:
+    client, inner, clock = _make_client(ReservedIpError("Reserved IP Address"))
+
+    for _ in range(2):
+        with pytest.raises(ReservedIpError):
+            await client.lookup_ip("10.0.0.1")
+    assert inner.calls == ["10.0.0.1"]
+
+    clock.now = 11.0
+    with pytest.raises(ReservedIpError):
+        await client.lookup_ip("10.0.0.1")
+    assert inner.calls == ["10.0.0.1", "10.0.0.1"]
+
+
+async def test_other_provider_errors_are_not_cached() -> None:
+    client, inner, _ = _make_client(IpNotFoundError("not found"))
+
+    for _ in range(2):
+        with pytest.raises(IpNotFoundError):
+            await client.lookup_ip("203.0.113.10")
+
+    assert inner.calls == ["203.0.113.10", "203.0.113.10"]
+
+
+async def test_concurrent_misses_for_same_ip_share_one_upstream_call() -> None:
+    client, inner, _ = _make_client(GEO_DATA)
+    inner.release.clear()
+
+    lookups = asyncio.gather(*(client.lookup_ip("8.8.8.8") for _ in range(5)))
+    await asyncio.sleep(0)
+    inner.release.set()
+    results = await lookups
+
+    assert results == [GEO_DATA] * 5
+    assert inner.calls == ["8.8.8.8"]
+
+
+async def test_concurrent_misses_share_the_upstream_error() -> None:
+    client, inner, _ = _make_client(IpNotFoundError("not found"))
+    inner.release.clear()
+
+    lookups = asyncio.gather(*(client.lookup_ip("203.0.113.10") for _ in range(3)), return_exceptions=True)
+    await asyncio.sleep(0)
+    inner.release.set()
+    results = await lookups
+
+    assert all(isinstance(result, IpNotFoundError) for result in results)
+    assert inner.calls == ["203.0.113.10"]
+
+
+async def test_lookup_ips_sends_distinct_misses_in_one_batch() -> None:
+    client, inner, _ = _make_client(GEO_DATA)
+    await client.lookup_ip("9.9.9.9")
+
+    results = await client.lookup_ips(["8.8.8.8", "9.9.9.9", "1.1.1.1", "8.8.8.8"])
+
+    assert results == [GEO_DATA] * 4
+    assert inner.batches == [["8.8.8.8", "1.1.1.1"]]
+
+    await client.lookup_ips(["1.1.1.1"])
+    assert len(inner.batches) == 1
+
+
+async def test_lookup_ips_returns_provider_errors_in_place() -> None:
+    client, inner, _ = _make_client(ReservedIpError("Reserved IP Address"))
+
+    results = await client.lookup_ips(["10.0.0.1", "192.168.0.1"])
+
+    assert all(isinstance(result, ReservedIpError) for result in results)
+    with pytest.raises(ReservedIpError):
+        await client.lookup_ip("10.0.0.1")
+    assert len(inner.calls) == 2
+
+
+async def test_concurrent_client_ip_lookups_are_coalesced_but_not_cached() -> None:
+    client, inner, _ = _make_client(GEO_DATA)
+    inner.release.clear()
+
+    lookups = asyncio.gather(*(client.lookup_client_ip() for _ in range(3)))
+    await asyncio.sleep(0)
+    inner.release.set()
+    assert await lookups == [GEO_DATA] * 3
+    assert inner.calls == ["<client>"]
+
+    await client.lookup_client_ip()
+    assert inner.calls == ["<client>", "<client>"]
@@ -1,29 +1,27 @@
-from collections.abc import Callable
+from collections.abc import AsyncIterator
 from http import HTTPStatus
-from typing import Any
 
-import httpx
 import pytest
 
 from src.clients.ip_api_co_client import IpApiCo, IPGeolocationData
-from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
-from tests.common import FailingAsyncClient, MockAsyncClient, MockResponse
+from src.errors import InvalidIpError, ReservedIpError, UpstreamServiceError
+from tests.common import MockResponse, RecordingTransport, mock_http_client
 
 
-def make_fake_async_client(response: MockResponse) -> Callable[..., MockAsyncClient]:
-    """Factory for a fake httpx.AsyncClient returning a fixed response.
+@pytest.fixture(scope="module")
+def transport() -> RecordingTransport:
+    """One mock transport shared by the module; each test sets the response it needs."""
+    return RecordingTransport()
 
-    This avoids repeating the same stub definition in every test.
-    """
 
-    def _fake_client(*args: Any, **kwargs: Any) -> MockAsyncClient:
-        return MockAsyncClient(response)
+@pytest.fixture(scope="module")
+async def ip_api_co_client(transport: RecordingTransport) -> AsyncIterator[IpApiCo]:
+    """One provider client shared by the module's tests, as the app shares one per provider."""
+    async with mock_http_client(transport) as http_client:
+        yield IpApiCo(http_client)
 
-    return _fake_client
 
-
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_success(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_get_geolocation_for_ip_success(transport: RecordingTransport, ip_api_co_client: IpApiCo) -> None:
     """Happy path: successful lookup with string lat/lon coerced to float."""
     payload = {
         "ip": "8.8.8.8",
@@ -38,67 +36,41 @@ async def test_get_geolocation_for_ip_success(monkeypatch: pytest.MonkeyPatch) -
     }
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    transport.respond_with(response)
+    result = await ip_api_co_client.lookup_ip("8.8.8.8")
 
-    client = IpApiCo()
-    result = await client.lookup_ip("8.8.8.8")
+    assert transport.requested_urls == ["/8.8.8.8/json/"]
 
     assert isinstance(result, IPGeolocationData)
-    assert result.ip == "8.8.8.8"
-    assert result.country == "US"
-    assert result.country_name == "United States"
-    assert result.region == "California"
-    assert result.city == "Mountain View"
-    # Use pytest.approx to allow for minor floating-point representation differences.
-    assert result.latitude == pytest.approx(37.386)
-    assert result.longitude == pytest.approx(-122.0838)
-    assert result.timezone == "America/Los_Angeles"
-    assert result.isp == "Google LLC"
-
-
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_invalid_ip_error(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Coordinates that arrive as strings are parsed, so compare them with pytest.approx;
+    # JSON floats are passed through unchanged and compared exactly.
+    assert result.model_dump() == {
+        "ip": "8.8.8.8",
+        "country": "US",
+        "country_name": "United States",
+        "region": "California",
+        "city": "Mountain View",
+        "postal_code": None,
+        "latitude": pytest.approx(37.386),
+        "longitude": pytest.approx(-122.0838),
+        "timezone": "America/Los_Angeles",
+        "isp": "Google LLC",
+    }
+
+
+async def test_get_geolocation_for_ip_invalid_ip_error(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
+) -> None:
     """ipapi.co indicates an invalid IP via an error flag in the JSON payload."""
     payload = {"error": True, "reason": "Invalid IP address"}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCo()
+    transport.respond_with(response)
     with pytest.raises(InvalidIpError):
-        await client.lookup_ip("999.999.999.999")
-
-
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_not_found(monkeypatch: pytest.MonkeyPatch) -> None:
-    """404 from ipapi.co is translated to IpNotFoundError."""
-    response = MockResponse(status_code=HTTPStatus.NOT_FOUND, payload={}, text="Not Found")
-
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCo()
-    with pytest.raises(IpNotFoundError):
-        await client.lookup_ip("203.0.113.10")
+        await ip_api_co_client.lookup_ip("999.999.999.999")
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_upstream_5xx(monkeypatch: pytest.MonkeyPatch) -> None:
-    """5xx from ipapi.co is translated to UpstreamServiceError."""
-    response = MockResponse(
-        status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-        payload={},
-        text="Internal Server Error",
-    )
-
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCo()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.4.4")
-
-
-@pytest.mark.asyncio
-async def test_get_geolocation_for_client_ip(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_get_geolocation_for_client_ip(transport: RecordingTransport, ip_api_co_client: IpApiCo) -> None:
     """Client IP lookup uses the /json/ endpoint and normalizes the payload."""
     payload = {
         "ip": "198.51.100.42",
@@ -109,105 +81,118 @@ async def test_get_geolocation_for_client_ip(monkeypatch: pytest.MonkeyPatch) ->
     }
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    transport.respond_with(response)
+    result = await ip_api_co_client.lookup_client_ip()
 
-    client = IpApiCo()
-    result = await client.lookup_client_ip()
+    assert transport.requested_urls == ["/json/"]
 
-    assert result.ip == "198.51.100.42"
-    assert result.country == "DE"
-    assert result.country_name == "Germany"
-    # Use pytest.approx to allow for minor floating-point representation differences.
-    assert result.latitude == pytest.approx(52.52)
-    assert result.longitude == pytest.approx(13.405)
+    assert result.model_dump(exclude_none=True) == {
+        "ip": "198.51.100.42",
+        "country": "DE",
+        "country_name": "Germany",
+        "latitude": 52.52,
+        "longitude": 13.405,
+    }
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_reserved_ip_error(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_get_geolocation_for_ip_reserved_ip_error(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
+) -> None:
     """ipapi.co indicates a reserved/private IP via an error flag in the JSON payload."""
     payload = {"error": True, "reason": "Reserved IP Address", "reserved": True}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCo()
+    transport.respond_with(response)
     with pytest.raises(ReservedIpError):
-        await client.lookup_ip("192.168.0.1")
+        await ip_api_co_client.lookup_ip("192.168.0.1")
 
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "status_code",
-    [
-        HTTPStatus.BAD_REQUEST,
-        HTTPStatus.FORBIDDEN,
-        HTTPStatus.METHOD_NOT_ALLOWED,
-    ],
-)
-async def test_get_geolocation_for_ip_http_error_statuses_raise_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
-    status_code: HTTPStatus,
+async def test_get_geolocation_for_ip_reserved_flag_with_unknown_reason(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
 ) -> None:
-    """HTTP 4xx responses (except 404/429) from ipapi.co are mapped to UpstreamServiceError."""
-    response = MockResponse(status_code=status_code, payload={}, text="Some error")
+    """The `reserved` flag maps to ReservedIpError even when the reason text is unfamiliar."""
+    payload = {"error": True, "reason": "Private network", "reserved": True}
+    response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
+
+    transport.respond_with(response)
+    with pytest.raises(ReservedIpError):
+        await ip_api_co_client.lookup_ip("10.0.0.1")
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
 
-    client = IpApiCo()
+async def test_get_geolocation_for_ip_json_rate_limited_error(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
+) -> None:
+    """JSON body with RateLimited reason is mapped to UpstreamServiceError."""
+    payload = {"error": True, "reason": "RateLimited", "message": "Too many requests"}
+    response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
+
+    transport.respond_with(response)
     with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+        await ip_api_co_client.lookup_ip("8.8.8.8")
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_http_429_raises_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+async def test_get_geolocation_for_ip_json_quota_exceeded_error(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
 ) -> None:
-    """HTTP 429 responses from ipapi.co are mapped to UpstreamServiceError."""
-    response = MockResponse(status_code=HTTPStatus.TOO_MANY_REQUESTS, payload={}, text="Too Many Requests")
-
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    """JSON body with quota exceeded reason is mapped to UpstreamServiceError."""
+    payload = {"error": True, "reason": "Quota exceeded", "message": "Daily quota exceeded"}
+    response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    client = IpApiCo()
+    transport.respond_with(response)
     with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+        await ip_api_co_client.lookup_ip("8.8.8.8")
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_json_rate_limited_error(monkeypatch: pytest.MonkeyPatch) -> None:
-    """JSON body with RateLimited reason is mapped to UpstreamServiceError."""
-    payload = {"error": True, "reason": "RateLimited", "message": "Too many requests"}
+async def test_get_geolocation_for_ip_unparseable_coordinates_are_none(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
+) -> None:
+    """Coordinates that cannot be coerced to floats are normalized to None."""
+    payload = {"ip": "8.8.8.8", "country": "US", "country_name": "United States", "latitude": "n/a"}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    transport.respond_with(response)
+    result = await ip_api_co_client.lookup_ip("8.8.8.8")
 
-    client = IpApiCo()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert result.latitude is None
+    assert result.longitude is None
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_json_quota_exceeded_error(monkeypatch: pytest.MonkeyPatch) -> None:
-    """JSON body with quota exceeded reason is mapped to UpstreamServiceError."""
-    payload = {"error": True, "reason": "Quota exceeded", "message": "Daily quota exceeded"}
-    response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
+async def test_lookup_ips_fans_out_one_request_per_ip(transport: RecordingTransport, ip_api_co_client: IpApiCo) -> None:
+    """Batch lookups issue one upstream request per IP and return results in order."""
+    response = MockResponse(status_code=HTTPStatus.OK, payload={"ip": "8.8.8.8", "country": "US"})
+    transport.respond_with(response)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    results = await ip_api_co_client.lookup_ips(["8.8.8.8", "1.1.1.1"])
 
-    client = IpApiCo()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert sorted(transport.requested_urls) == ["/1.1.1.1/json/", "/8.8.8.8/json/"]
+    assert [result.country for result in results if isinstance(result, IPGeolocationData)] == ["US", "US"]
 
 
-@pytest.mark.asyncio
-async def test_get_geolocation_for_ip_network_failure_raises_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+async def test_get_geolocation_rounds_string_coordinates_and_keeps_floats(
+    transport: RecordingTransport, ip_api_co_client: IpApiCo
 ) -> None:
-    """Network failures from httpx.AsyncClient are mapped to UpstreamServiceError."""
+    """String coordinates are parsed and rounded to 6 decimals; JSON floats pass through unchanged."""
+    payload = {"ip": "8.8.8.8", "country": "US", "latitude": "37.12345678", "longitude": -122.12345678}
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, payload=payload))
 
-    monkeypatch.setattr(
-        httpx, "AsyncClient", lambda *args, **kwargs: FailingAsyncClient("https://ipapi.co", *args, **kwargs)
-    )
+    result = await ip_api_co_client.lookup_ip("8.8.8.8")
 
-    client = IpApiCo()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert result.latitude == 37.123457
+    assert result.longitude == -122.12345678
+
+
+@pytest.mark.parametrize(
+    ("reason", "expected_error"),
+    [
+        ("Reserved range: invalid request", InvalidIpError),
+        ("Quota exceeded for invalid key", InvalidIpError),
+        ("Quota exceeded for reserved address", ReservedIpError),
+    ],
+)
+async def test_get_geolocation_for_ip_reason_with_several_keywords_uses_priority(
+    reason: str, expected_error: type[Exception], transport: RecordingTransport, ip_api_co_client: IpApiCo
+) -> None:
+    """When a reason mentions several error kinds, invalid wins over reserved, which wins over rate limiting."""
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, payload={"error": True, "reason": reason}))
+    with pytest.raises(expected_error):
+        await ip_api_co_client.lookup_ip("8.8.8.8")
@@ -1,26 +1,30 @@
-from collections.abc import Callable
+from collections.abc import AsyncIterator
 from http import HTTPStatus
 from typing import Any
 
 import httpx
+import orjson
 import pytest
 
 from src.clients.ip_api_com_client import IpApiCom, IPGeolocationData
 from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
-from tests.common import FailingAsyncClient, MockAsyncClient, MockResponse
+from tests.common import MockResponse, RecordingTransport, mock_http_client
 
 
-def make_fake_async_client(response: MockResponse) -> Callable[..., MockAsyncClient]:
-    """Factory for a fake httpx.AsyncClient returning a fixed response."""
+@pytest.fixture(scope="module")
+def transport() -> RecordingTransport:
+    """One mock transport shared by the module; each test sets the response it needs."""
+    return RecordingTransport()
 
-    def _fake_client(*args: Any, **kwargs: Any) -> MockAsyncClient:
-        return MockAsyncClient(response)
 
-    return _fake_client
+@pytest.fixture(scope="module")
+async def ip_api_com_client(transport: RecordingTransport) -> AsyncIterator[IpApiCom]:
+    """One provider client shared by the module's tests, as the app shares one per provider."""
+    async with mock_http_client(transport) as http_client:
+        yield IpApiCom(http_client)
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_success(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_lookup_ip_success(transport: RecordingTransport, ip_api_com_client: IpApiCom) -> None:
     """Happy path: successful lookup with normalized fields."""
     payload = {
         "status": "success",
@@ -37,26 +41,27 @@ async def test_lookup_ip_success(monkeypatch: pytest.MonkeyPatch) -> None:
     }
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    transport.respond_with(response)
+    result = await ip_api_com_client.lookup_ip("8.8.8.8")
 
-    client = IpApiCom()
-    result = await client.lookup_ip("8.8.8.8")
+    assert transport.requested_urls == ["/json/8.8.8.8"]
 
     assert isinstance(result, IPGeolocationData)
-    assert result.ip == "8.8.8.8"
-    assert result.country == "US"
-    assert result.country_name == "United States"
-    assert result.region == "California"
-    assert result.city == "Mountain View"
-    assert result.postal_code == "94043"
-    assert result.latitude == pytest.approx(37.386)
-    assert result.longitude == pytest.approx(-122.0838)
-    assert result.timezone == "America/Los_Angeles"
-    assert result.isp == "Google LLC"
-
-
-@pytest.mark.asyncio
-async def test_lookup_client_ip_success(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert result.model_dump() == {
+        "ip": "8.8.8.8",
+        "country": "US",
+        "country_name": "United States",
+        "region": "California",
+        "city": "Mountain View",
+        "postal_code": "94043",
+        "latitude": 37.386,
+        "longitude": -122.0838,
+        "timezone": "America/Los_Angeles",
+        "isp": "Google LLC",
+    }
+
+
+async def test_lookup_client_ip_success(transport: RecordingTransport, ip_api_com_client: IpApiCom) -> None:
     """Client IP lookup uses the /json/ endpoint and normalizes payload."""
     payload = {
         "status": "success",
@@ -68,168 +73,131 @@ async def test_lookup_client_ip_success(monkeypatch: pytest.MonkeyPatch) -> None
     }
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    transport.respond_with(response)
+    result = await ip_api_com_client.lookup_client_ip()
 
-    client = IpApiCom()
-    result = await client.lookup_client_ip()
+    assert transport.requested_urls == ["/json/"]
 
-    assert result.ip == "198.51.100.42"
-    assert result.country == "DE"
-    assert result.country_name == "Germany"
-    assert result.latitude == pytest.approx(52.52)
-    assert result.longitude == pytest.approx(13.405)
+    assert result.model_dump(exclude_none=True) == {
+        "ip": "198.51.100.42",
+        "country": "DE",
+        "country_name": "Germany",
+        "latitude": 52.52,
+        "longitude": 13.405,
+    }
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_invalid_ip_error_from_status(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_lookup_ip_invalid_ip_error_from_status(
+    transport: RecordingTransport, ip_api_com_client: IpApiCom
+) -> None:
     """ip-api.com indicates an invalid IP via status/message in JSON payload."""
     payload = {"status": "fail", "message": "invalid query"}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
+    transport.respond_with(response)
     with pytest.raises(InvalidIpError):
-        await client.lookup_ip("999.999.999.999")
+        await ip_api_com_client.lookup_ip("999.999.999.999")
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_reserved_ip_error_from_status(monkeypatch: pytest.MonkeyPatch) -> None:
+@pytest.mark.parametrize("message", ["private range", "reserved range", "Reserved Range "])
+async def test_lookup_ip_reserved_ip_error_from_status(
+    message: str, transport: RecordingTransport, ip_api_com_client: IpApiCom
+) -> None:
     """ip-api.com indicates a reserved/private IP via status/message."""
-    payload = {"status": "fail", "message": "private range"}
+    payload = {"status": "fail", "message": message}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
+    transport.respond_with(response)
     with pytest.raises(ReservedIpError):
-        await client.lookup_ip("192.168.0.1")
-
+        await ip_api_com_client.lookup_ip("192.168.0.1")
 
-@pytest.mark.asyncio
-async def test_lookup_ip_not_found_http_404(monkeypatch: pytest.MonkeyPatch) -> None:
-    """HTTP 404 is translated to IpNotFoundError."""
-    response = MockResponse(status_code=HTTPStatus.NOT_FOUND, payload={}, text="Not Found")
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
-    with pytest.raises(IpNotFoundError):
-        await client.lookup_ip("203.0.113.10")
-
-
-@pytest.mark.asyncio
-async def test_lookup_ip_not_found_from_status(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_lookup_ip_not_found_from_status(transport: RecordingTransport, ip_api_com_client: IpApiCom) -> None:
     """Provider status 'fail' with 'not found' message maps to IpNotFoundError."""
     payload = {"status": "fail", "message": "not found"}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
+    transport.respond_with(response)
     with pytest.raises(IpNotFoundError):
-        await client.lookup_ip("203.0.113.10")
+        await ip_api_com_client.lookup_ip("203.0.113.10")
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_quota_exceeded_from_status(monkeypatch: pytest.MonkeyPatch) -> None:
+async def test_lookup_ip_quota_exceeded_from_status(transport: RecordingTransport, ip_api_com_client: IpApiCom) -> None:
     """Quota/limit messages are mapped to UpstreamServiceError."""
     payload = {"status": "fail", "message": "quota exceeded for this key"}
     response = MockResponse(status_code=HTTPStatus.OK, payload=payload)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
+    transport.respond_with(response)
     with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+        await ip_api_com_client.lookup_ip("8.8.8.8")
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_http_429_raises_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+async def test_lookup_ips_uses_native_batch_endpoint(
+    transport: RecordingTransport, ip_api_com_client: IpApiCom
 ) -> None:
-    """HTTP 429 responses are mapped to UpstreamServiceError."""
-    response = MockResponse(status_code=HTTPStatus.TOO_MANY_REQUESTS, payload={}, text="Too Many Requests")
+    """A batch is sent as one POST /batch; per-IP failures are returned in place."""
+    payload: list[dict[str, Any]] = [
+        {"status": "success", "query": "8.8.8.8", "countryCode": "US", "country": "United States", "lat": 37.4},
+        {"status": "fail", "message": "private range", "query": "10.0.0.1"},
+    ]
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, payload=payload))
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    results = await ip_api_com_client.lookup_ips(["8.8.8.8", "10.0.0.1"])
 
-    client = IpApiCom()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert transport.requested_urls == ["/batch"]
+    assert transport.posted_contents == [b'["8.8.8.8","10.0.0.1"]']
+    assert isinstance(results[0], IPGeolocationData)
+    assert results[0].country == "US"
+    assert isinstance(results[1], ReservedIpError)
 
 
-@pytest.mark.asyncio
-@pytest.mark.parametrize(
-    "status_code",
-    [
-        HTTPStatus.BAD_REQUEST,
-        HTTPStatus.FORBIDDEN,
-        HTTPStatus.METHOD_NOT_ALLOWED,
-    ],
-)
-async def test_lookup_ip_http_4xx_statuses_raise_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
-    status_code: HTTPStatus,
-) -> None:
-    """HTTP 4xx responses (except 404/429) are mapped to UpstreamServiceError."""
-    response = MockResponse(status_code=status_code, payload={}, text="Some error")
+async def test_lookup_ips_fills_every_slot_when_batch_request_fails(failing_http_client: httpx.AsyncClient) -> None:
+    """A failed batch request reports the same upstream error for every IP."""
+    client = IpApiCom(failing_http_client)
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    results = await client.lookup_ips(["8.8.8.8", "1.1.1.1"])
 
-    client = IpApiCom()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert len(results) == 2
+    assert all(isinstance(result, UpstreamServiceError) for result in results)
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_http_5xx_statuses_raise_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+async def test_lookup_ips_rejects_mismatched_batch_response(
+    transport: RecordingTransport, ip_api_com_client: IpApiCom
 ) -> None:
-    """HTTP 5xx responses are mapped to UpstreamServiceError."""
-    response = MockResponse(
-        status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-        payload={},
-        text="Internal Server Error",
-    )
+    """A batch response whose length does not match the request is an upstream error."""
+    payload = [{"status": "success", "query": "8.8.8.8", "countryCode": "US", "country": "United States"}]
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, payload=payload))
 
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
+    results = await ip_api_com_client.lookup_ips(["8.8.8.8", "1.1.1.1"])
 
-    client = IpApiCom()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.4.4")
+    assert all(isinstance(result, UpstreamServiceError) for result in results)
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_network_failure_raises_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+async def test_lookup_ips_reports_malformed_batch_elements_in_place(
+    transport: RecordingTransport, ip_api_com_client: IpApiCom
 ) -> None:
-    """Network failures from httpx.AsyncClient are mapped to UpstreamServiceError."""
+    """A batch element that is not an object is an upstream error for that IP only."""
+    payload = [{"status": "success", "query": "8.8.8.8", "countryCode": "US", "country": "United States"}, None, "x", 1]
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, content=orjson.dumps(payload)))
 
-    monkeypatch.setattr(
-        httpx,
-        "AsyncClient",
-        lambda *args, **kwargs: FailingAsyncClient("http://ip-api.com", *args, **kwargs),
-    )
+    results = await ip_api_com_client.lookup_ips(["8.8.8.8", "1.1.1.1", "9.9.9.9", "4.4.4.4"])
 
-    client = IpApiCom()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    assert isinstance(results[0], IPGeolocationData)
+    assert all(isinstance(result, UpstreamServiceError) for result in results[1:])
 
 
-@pytest.mark.asyncio
-async def test_lookup_ip_invalid_json_raises_upstream_service_error(
-    monkeypatch: pytest.MonkeyPatch,
+@pytest.mark.parametrize(
+    ("message", "expected_error"),
+    [
+        ("reserved range, invalid query", InvalidIpError),
+        ("quota limit for private range", ReservedIpError),
+        ("not found: rate limit", UpstreamServiceError),
+    ],
+)
+async def test_lookup_ip_message_with_several_keywords_uses_priority(
+    message: str, expected_error: type[Exception], transport: RecordingTransport, ip_api_com_client: IpApiCom
 ) -> None:
-    """Non-JSON responses are mapped to UpstreamServiceError via JSON decode failure."""
-
-    class BadJsonResponse(MockResponse):
-        def json(self) -> dict[str, Any]:
-            raise ValueError("not json")
-
-    response = BadJsonResponse(status_code=HTTPStatus.OK, payload={})
-
-    monkeypatch.setattr(httpx, "AsyncClient", make_fake_async_client(response))
-
-    client = IpApiCom()
-    with pytest.raises(UpstreamServiceError):
-        await client.lookup_ip("8.8.8.8")
+    """When a message mentions several error kinds, the same order as the documented cases applies."""
+    transport.respond_with(MockResponse(status_code=HTTPStatus.OK, payload={"status": "fail", "message": message}))
+    with pytest.raises(expected_error):
+        await ip_api_com_client.lookup_ip("8.8.8.8")
@@ -0,0 +1,63 @@
+import itertools
+from collections.abc import Callable
+from http import HTTPStatus
+
+import httpx
+import pytest
+
+from src.clients.base import BaseIPLookupClient
+from src.clients.ip_api_co_client import IpApiCo
+from src.clients.ip_api_com_client import IpApiCom
+from src.errors import IpNotFoundError, IpProviderError, UpstreamServiceError
+from tests.common import MockResponse, RecordingTransport, error_response, mock_http_client
+
+# Behavior shared by every provider client, checked once per client.
+CLIENTS: list[Callable[[httpx.AsyncClient], BaseIPLookupClient]] = [IpApiCo, IpApiCom]
+
+# HTTP error status -> expected domain error, as plain ints so collection does no enum lookups.
+HTTP_ERROR_CASES: tuple[tuple[int, type[IpProviderError]], ...] = (
+    (404, IpNotFoundError),
+    (400, UpstreamServiceError),
+    (403, UpstreamServiceError),
+    (405, UpstreamServiceError),
+    (429, UpstreamServiceError),
+    (500, UpstreamServiceError),
+)
+
+# Every client against every status, precomputed once so collection expands a single parametrize.
+HTTP_ERROR_MATRIX = list(itertools.product(CLIENTS, HTTP_ERROR_CASES))
+
+
+@pytest.mark.parametrize(
+    ("client_cls", "case"), HTTP_ERROR_MATRIX, ids=[f"{code}-{cls.__name__}" for cls, (code, _) in HTTP_ERROR_MATRIX]
+)
+async def test_lookup_ip_maps_http_error_status_to_domain_error(
+    client_cls: Callable[[httpx.AsyncClient], BaseIPLookupClient], case: tuple[int, type[IpProviderError]]
+) -> None:
+    """HTTP error statuses are translated to the matching domain error."""
+    status_code, expected_error = case
+    async with mock_http_client(RecordingTransport(error_response(status_code, "Some error"))) as http_client:
+        with pytest.raises(expected_error):
+            await client_cls(http_client).lookup_ip("8.8.8.8")
+
+
+@pytest.mark.parametrize("client_cls", CLIENTS)
+async def test_lookup_ip_network_failure_raises_upstream_service_error(
+    client_cls: Callable[[httpx.AsyncClient], BaseIPLookupClient], failing_http_client: httpx.AsyncClient
+) -> None:
+    """Network failures from httpx.AsyncClient are mapped to UpstreamServiceError."""
+    client = client_cls(failing_http_client)
+    with pytest.raises(UpstreamServiceError):
+        await client.lookup_ip("8.8.8.8")
+
+
+@pytest.mark.parametrize("client_cls", CLIENTS)
+async def test_lookup_ip_invalid_json_raises_upstream_service_error(
+    client_cls: Callable[[httpx.AsyncClient], BaseIPLookupClient],
+) -> None:
+    """Non-JSON responses are mapped to UpstreamServiceError via JSON decode failure."""
+    response = MockResponse(status_code=HTTPStatus.OK, content=b"<html>not json</html>")
+
+    async with mock_http_client(RecordingTransport(response)) as http_client:
+        with pytest.raises(UpstreamServiceError):
+            await client_cls(http_client).lookup_ip("8.8.8.8")
@@ -3,12 +3,12 @@ from typing import Any
 import pytest
 from pydantic import ValidationError
 
-from src.models.request_models import IPLookupRequest
+from src.models.request_models import IPLookupRequest, _is_ip_literal, is_ip_address, is_reserved_ip
 
 
 def _build_request(ip: Any) -> IPLookupRequest:
     """Helper to construct IPLookupRequest, used to keep tests small."""
-    return IPLookupRequest(ip=ip)
+    return IPLookupRequest.model_validate({"ip": ip})
 
 
 def test_ip_lookup_request_allows_valid_ipv4() -> None:
@@ -39,3 +39,47 @@ def test_ip_lookup_request_rejects_invalid_ip() -> None:
     """Non-empty, non-IP strings are rejected by validation."""
     with pytest.raises(ValidationError):
         _build_request("qwerty")
+
+
+@pytest.mark.parametrize("ip", ["256.1.1.1", "1.2.3", "01.2.3.4", "2001:db8::g", "1:2:3:4:5:6:7:8:9", "8.8.8.8/32"])
+def test_ip_lookup_request_rejects_malformed_ip_literals(ip: str) -> None:
+    """Strings that merely look like IPs are rejected as well."""
+    with pytest.raises(ValidationError):
+        _build_request(ip)
+
+
+def test_ip_lookup_request_allows_ipv4_mapped_ipv6() -> None:
+    """IPv4-mapped IPv6 addresses are accepted."""
+    req = _build_request("::ffff:8.8.8.8")
+    assert req.ip == "::ffff:8.8.8.8"
+
+
+def test_ip_validation_result_is_memoized() -> None:
+    """Repeated validation of the same IP is served from the LRU cache."""
+    _is_ip_literal.cache_clear()
+    _build_request("1.1.1.1")
+    _build_request("1.1.1.1")
+    assert _is_ip_literal.cache_info().hits == 1
+
+
+@pytest.mark.parametrize(
+    ("ip", "reserved"),
+    [
+        ("8.8.8.8", False),
+        ("2001:4860:4860::8888", False),
+        ("::ffff:8.8.8.8", False),
+        ("172.16.0.1", True),
+        ("0.0.0.0", True),
+        ("224.0.0.1", True),
+    ],
+)
+def test_is_reserved_ip(ip: str, reserved: bool) -> None:
+    """Public IPs (including IPv4-mapped ones) are not reserved; private/special ranges are."""
+    assert is_reserved_ip(ip) is reserved
+
+
+def test_over_long_input_is_rejected_without_being_cached() -> None:
+    """Strings longer than any IP literal are rejected before reaching the LRU cache."""
+    _is_ip_literal.cache_clear()
+    assert is_ip_address("1" * 1_000_000) is False
+    assert _is_ip_literal.cache_info().currsize == 0
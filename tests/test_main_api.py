@@ -1,9 +1,22 @@
-from fastapi.testclient import TestClient
+import asyncio
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+import httpx
+import orjson
+import pytest
 
 from src.clients.base import BaseIPLookupClient
-from src.errors import InvalidIpError, IpNotFoundError, ReservedIpError, UpstreamServiceError
-from src.main import app, get_ip_lookup_provider_factory
+from src.clients.http import create_http_client
+from src.errors import InvalidIpError, IpNotFoundError, IpProviderError, ReservedIpError, UpstreamServiceError
+from src.main import app, get_ip_lookup_provider_factory, get_response_cache
+from src.models.common import IPGeolocationData
 from src.models.request_models import Provider
+from src.models.response_models import IPLookupResponse
+from src.response_cache import REDIS_URL_ENV, ResponseCache, create_response_cache
+from tests.common import FakeRedis, hanging_redis_url
 
 
 class _ErrorRaisingClient:
@@ -12,13 +25,29 @@ class _ErrorRaisingClient:
     def __init__(self, exc: Exception) -> None:
         self._exc = exc
 
-    async def lookup_ip(self, ip: str) -> None:
+    async def lookup_ip(self, ip: str) -> IPGeolocationData:
+        raise self._exc
+
+    async def lookup_client_ip(self) -> IPGeolocationData:
         raise self._exc
 
-    async def lookup_client_ip(self) -> None:
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
         raise self._exc
 
 
+class _StaticClient:
+    """Test double for a provider client that always returns the same geolocation data."""
+
+    def __init__(self, data: IPGeolocationData) -> None:
+        self._data = data
+
+    async def lookup_ip(self, ip: str) -> IPGeolocationData:
+        return self._data
+
+    async def lookup_client_ip(self) -> IPGeolocationData:
+        return self._data
+
+
 class _ErrorRaisingFactory:
     """Test double for IpLookupProviderFactory that always returns an error-raising client."""
 
@@ -29,45 +58,279 @@ class _ErrorRaisingFactory:
         return _ErrorRaisingClient(self._exc)
 
 
-def _call_lookup_with_error(exc: Exception) -> tuple[int, dict]:
-    """Helper that wires a failing client and calls the /v1/ip/lookup endpoint."""
-    app.dependency_overrides[get_ip_lookup_provider_factory] = lambda: _ErrorRaisingFactory(exc)
-    client = TestClient(app)
+async def _no_response_cache() -> None:
+    """Dependency override that disables the response cache."""
+    return
+
+
+@contextmanager
+def _overridden(overrides: dict[Callable[..., Any], Callable[..., Any]]) -> Iterator[None]:
+    """Apply dependency overrides for the duration of the block.
+
+    Only the keys set here are removed afterwards, so `app.dependency_overrides` is left
+    as the test found it rather than cleared wholesale.
+    """
+    app.dependency_overrides.update(overrides)
     try:
-        response = client.get("/v1/ip/lookup?ip=8.8.8.8")
-        return response.status_code, response.json()
+        yield
     finally:
-        app.dependency_overrides.clear()
+        for dependency in overrides:
+            app.dependency_overrides.pop(dependency, None)
 
 
-def test_ip_lookup_maps_invalid_ip_error_to_400() -> None:
-    status_code, body = _call_lookup_with_error(InvalidIpError("Invalid IP Address"))
+@pytest.fixture(scope="module")
+async def client() -> AsyncIterator[httpx.AsyncClient]:
+    """One in-process ASGI client shared by the module's tests (the lifespan is not started)."""
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _call_lookup_with_error(client: httpx.AsyncClient, exc: Exception) -> tuple[int, dict]:
+    """Helper that wires a failing client and calls the /v1/ip/lookup endpoint."""
+    with _overridden(
+        {
+            get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(exc),
+            get_response_cache: _no_response_cache,
+        }
+    ):
+        response = await client.get("/v1/ip/lookup?ip=8.8.8.8")
+    return response.status_code, response.json()
+
+
+async def test_ip_lookup_maps_invalid_ip_error_to_400(client: httpx.AsyncClient) -> None:
+    status_code, body = await _call_lookup_with_error(client, InvalidIpError("Invalid IP Address"))
 
     assert status_code == 400
     assert body["detail"]["code"] == "invalid_ip"
     assert "Invalid IP Address" in body["detail"]["message"]
+    assert body["detail"]["provider"] == "ipapi.co"
 
 
-def test_ip_lookup_maps_reserved_ip_error_to_400() -> None:
-    status_code, body = _call_lookup_with_error(ReservedIpError("Reserved IP Address"))
+async def test_ip_lookup_maps_reserved_ip_error_to_400(client: httpx.AsyncClient) -> None:
+    status_code, body = await _call_lookup_with_error(client, ReservedIpError("Reserved IP Address"))
 
     assert status_code == 400
     assert body["detail"]["code"] == "reserved_ip"
     assert "Reserved IP Address" in body["detail"]["message"]
 
 
-def test_ip_lookup_maps_ip_not_found_error_to_404() -> None:
-    status_code, body = _call_lookup_with_error(
-        IpNotFoundError("No geolocation information found for this IP address.")
+async def test_ip_lookup_maps_ip_not_found_error_to_404(client: httpx.AsyncClient) -> None:
+    status_code, body = await _call_lookup_with_error(
+        client, IpNotFoundError("No geolocation information found for this IP address.")
     )
 
     assert status_code == 404
     assert body["detail"]["code"] == "ip_not_found"
 
 
-def test_ip_lookup_maps_upstream_service_error_to_502() -> None:
-    status_code, body = _call_lookup_with_error(UpstreamServiceError("Upstream failure"))
+async def test_ip_lookup_maps_upstream_service_error_to_502(client: httpx.AsyncClient) -> None:
+    status_code, body = await _call_lookup_with_error(client, UpstreamServiceError("Upstream failure"))
 
     assert status_code == 502
     assert body["detail"]["code"] == "upstream_error"
     assert "Upstream failure" in body["detail"]["message"]
+
+
+async def test_ip_lookup_rejects_malformed_ip_with_invalid_ip_code(client: httpx.AsyncClient) -> None:
+    response = await client.get("/v1/ip/lookup?ip=not-an-ip")
+
+    assert response.status_code == 400
+    assert response.json()["code"] == "invalid_ip"
+
+
+async def test_lifespan_creates_and_closes_shared_http_clients() -> None:
+    async with app.router.lifespan_context(app):
+        http_clients = dict(app.state.http_clients)
+        assert set(http_clients) == set(Provider)
+        assert all(isinstance(c, httpx.AsyncClient) and not c.is_closed for c in http_clients.values())
+
+    assert all(c.is_closed for c in http_clients.values())
+
+
+async def test_lifespan_closes_http_clients_when_startup_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    created: list[httpx.AsyncClient] = []
+
+    def recording_http_client(base_url: str) -> httpx.AsyncClient:
+        created.append(create_http_client(base_url))
+        return created[-1]
+
+    def broken_response_cache() -> None:
+        raise ImportError("redis is not installed")
+
+    monkeypatch.setattr("src.main.create_http_client", recording_http_client)
+    monkeypatch.setattr("src.main.create_response_cache", broken_response_cache)
+    with pytest.raises(ImportError):
+        async with app.router.lifespan_context(app):
+            pass
+
+    assert len(created) == len(Provider)
+    assert all(c.is_closed for c in created)
+
+
+async def test_ip_lookup_returns_cached_response_without_calling_provider(client: httpx.AsyncClient) -> None:
+    redis = FakeRedis()
+    cache = ResponseCache(redis)
+    cached = IPLookupResponse(provider=Provider.ipapi_co, ip="8.8.8.8", country="US", country_name="United States")
+    redis.store[ResponseCache.key(Provider.ipapi_co, "8.8.8.8")] = cached.model_dump_json().encode()
+
+    with _overridden(
+        {
+            get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(
+                UpstreamServiceError("provider should not be called")
+            ),
+            get_response_cache: lambda: cache,
+        }
+    ):
+        response = await client.get("/v1/ip/lookup?ip=8.8.8.8")
+
+    assert response.status_code == 200
+    assert response.json() == cached.model_dump(mode="json")
+
+
+async def test_ip_lookup_falls_through_to_provider_when_redis_hangs(
+    client: httpx.AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("redis")
+    data = IPGeolocationData(ip="8.8.8.8", country="US", country_name="United States")
+    async with hanging_redis_url() as redis_url:
+        monkeypatch.setenv(REDIS_URL_ENV, redis_url)
+        cache = create_response_cache()
+        with _overridden(
+            {
+                get_ip_lookup_provider_factory: lambda: lambda provider: _StaticClient(data),
+                get_response_cache: lambda: cache,
+            }
+        ):
+            async with asyncio.timeout(2):
+                response = await client.get("/v1/ip/lookup?ip=8.8.8.8")
+        assert cache is not None
+        async with asyncio.timeout(2):
+            await cache.aclose()
+
+    assert response.status_code == 200
+    assert response.json() == {"provider": "ipapi.co", **data.model_dump()}
+
+
+async def test_lifespan_builds_one_provider_factory_with_stable_clients() -> None:
+    async with app.router.lifespan_context(app):
+        factory = app.state.ip_lookup_provider_factory
+        assert all(factory(provider) is factory(provider) for provider in Provider)
+
+
+async def test_ip_lookup_returns_provider_data_with_selected_provider(client: httpx.AsyncClient) -> None:
+    data = IPGeolocationData(ip="8.8.8.8", country="US", country_name="United States", latitude=37.386)
+    with _overridden(
+        {
+            get_ip_lookup_provider_factory: lambda: lambda provider: _StaticClient(data),
+            get_response_cache: _no_response_cache,
+        }
+    ):
+        response = await client.get("/v1/ip/lookup?ip=8.8.8.8&provider=ip-api.com")
+
+    assert response.status_code == 200
+    assert response.json() == {"provider": "ip-api.com", **data.model_dump()}
+
+
+class _BatchClient(_StaticClient):
+    """Test double that records batch lookups and reports 1.2.3.4 as not found in place."""
+
+    def __init__(self, data: IPGeolocationData) -> None:
+        super().__init__(data)
+        self.batches: list[list[str]] = []
+
+    async def lookup_ips(self, ips: Sequence[str]) -> list[IPGeolocationData | IpProviderError]:
+        self.batches.append(list(ips))
+        return [IpNotFoundError("Not found") if ip == "1.2.3.4" else self._data for ip in ips]
+
+
+async def test_ip_lookup_batch_returns_results_and_errors_in_request_order(client: httpx.AsyncClient) -> None:
+    data = IPGeolocationData(ip="8.8.8.8", country="US", country_name="United States")
+    batch_client = _BatchClient(data)
+    with _overridden({get_ip_lookup_provider_factory: lambda: lambda provider: batch_client}):
+        response = await client.post(
+            "/v1/ip/lookup:batch",
+            json={"ips": ["8.8.8.8", "not-an-ip", " 10.0.0.1 ", "1.2.3.4"], "provider": "ip-api.com"},
+        )
+
+    assert response.status_code == 200
+    first, second, third, fourth = response.json()["results"]
+    assert first == {"provider": "ip-api.com", **data.model_dump()}
+    assert second["ip"] == "not-an-ip"
+    assert second["code"] == "invalid_ip"
+    assert third["ip"] == "10.0.0.1"
+    assert third["code"] == "reserved_ip"
+    assert fourth == {"ip": "1.2.3.4", "code": "ip_not_found", "message": "Not found", "provider": "ip-api.com"}
+    # Only public, well-formed IPs reach the provider.
+    assert batch_client.batches == [["8.8.8.8", "1.2.3.4"]]
+
+
+async def test_ip_lookup_batch_rejects_over_long_entries(client: httpx.AsyncClient) -> None:
+    with _overridden(
+        {get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(UpstreamServiceError("not called"))}
+    ):
+        response = await client.post("/v1/ip/lookup:batch", json={"ips": ["1" * 46]})
+
+    assert response.status_code == 422
+
+
+async def test_ip_lookup_batch_defaults_to_ipapi_co_provider(client: httpx.AsyncClient) -> None:
+    data = IPGeolocationData(ip="8.8.8.8", country="US", country_name="United States")
+    batch_client = _BatchClient(data)
+    with _overridden({get_ip_lookup_provider_factory: lambda: lambda provider: batch_client}):
+        response = await client.post("/v1/ip/lookup:batch", json={"ips": ["8.8.8.8"]})
+
+    assert response.status_code == 200
+    assert response.json()["results"] == [{"provider": "ipapi.co", **data.model_dump()}]
+
+
+async def test_ip_lookup_batch_rejects_oversized_batch(client: httpx.AsyncClient) -> None:
+    with _overridden(
+        {get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(UpstreamServiceError("not called"))}
+    ):
+        response = await client.post("/v1/ip/lookup:batch", json={"ips": ["8.8.8.8"] * 101})
+
+    assert response.status_code == 422
+
+
+def test_exported_openapi_schema_matches_the_app() -> None:
+    """openapi.generated.json is regenerated (`python export_openapi.py`) whenever the API changes."""
+    exported = orjson.loads((Path(__file__).parents[1] / "openapi" / "openapi.generated.json").read_bytes())
+
+    assert orjson.loads(orjson.dumps(app.openapi())) == exported
+
+
+async def test_health_returns_ok(client: httpx.AsyncClient) -> None:
+    response = await client.get("/health")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"status": "ok"}
+
+
+@pytest.mark.parametrize("ip", ["127.0.0.1", "10.0.0.1", "192.168.1.1", "::1", "fe80::1", "::ffff:10.0.0.1"])
+async def test_ip_lookup_rejects_reserved_ip_without_calling_provider(ip: str, client: httpx.AsyncClient) -> None:
+    with _overridden(
+        {
+            get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(
+                UpstreamServiceError("provider should not be called")
+            ),
+            get_response_cache: _no_response_cache,
+        }
+    ):
+        response = await client.get("/v1/ip/lookup", params={"ip": ip})
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["code"] == "reserved_ip"
+
+
+async def test_ip_lookup_rejects_unknown_provider_with_422(client: httpx.AsyncClient) -> None:
+    with _overridden(
+        {
+            get_ip_lookup_provider_factory: lambda: _ErrorRaisingFactory(UpstreamServiceError("not called")),
+            get_response_cache: _no_response_cache,
+        }
+    ):
+        response = await client.get("/v1/ip/lookup", params={"ip": "8.8.8.8", "provider": "ABC"})
+
+    assert response.status_code == 422
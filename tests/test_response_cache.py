@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from src.logger import logger
+from src.models.request_models import Provider
+from src.response_cache import REDIS_URL_ENV, ResponseCache, create_response_cache
+from tests.common import FakeRedis, hanging_redis_url, slow_redis_url
+
+IP = "2001:4860:4860::8888"
+BODY = b'{"provider":"ipapi.co","ip":"2001:4860:4860::8888","country":"US","country_name":"United States"}'
+
+
+def test_key_normalizes_ip_spelling() -> None:
+    assert ResponseCache.key(Provider.ipapi_co, "2001:4860:4860::8888") == ResponseCache.key(
+        Provider.ipapi_co, "2001:4860:4860:0:0:0:0:8888"
+    )
+    assert ResponseCache.key(Provider.ip_api_com, "8.8.8.8") == "ipgeo:ip-api.com:8.8.8.8"
+
+
+async def test_set_then_get_round_trips_response_with_ttl() -> None:
+    redis = FakeRedis()
+    cache = ResponseCache(redis, ttl_seconds=60)
+
+    assert await cache.get(Provider.ipapi_co, IP) is None
+    await cache.set(Provider.ipapi_co, IP, BODY)
+
+    assert await cache.get(Provider.ipapi_co, IP) == BODY
+    assert list(redis.ttls.values()) == [60]
+
+
+async def test_redis_errors_are_treated_as_misses() -> None:
+    redis = FakeRedis()
+    redis.fail = True
+    cache = ResponseCache(redis)
+
+    await cache.set(Provider.ipapi_co, IP, BODY)
+
+    assert await cache.get(Provider.ipapi_co, IP) is None
+
+
+async def test_set_in_background_writes_without_blocking_and_flushes_on_close() -> None:
+    redis = FakeRedis()
+    cache = ResponseCache(redis)
+
+    cache.set_in_background(Provider.ipapi_co, IP, BODY)
+    assert redis.store == {}
+
+    await cache.aclose()
+    assert await cache.get(Provider.ipapi_co, IP) == BODY
+
+
+async def test_set_in_background_drops_writes_beyond_the_pending_limit() -> None:
+    redis = FakeRedis()
+    cache = ResponseCache(redis, max_pending_writes=1)
+
+    cache.set_in_background(Provider.ipapi_co, IP, BODY)
+    cache.set_in_background(Provider.ipapi_co, "8.8.8.8", BODY)
+    await cache.aclose()
+
+    assert list(redis.store) == [ResponseCache.key(Provider.ipapi_co, IP)]
+
+
+async def test_hanging_redis_is_treated_as_a_miss(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("redis")
+    async with hanging_redis_url() as redis_url:
+        monkeypatch.setenv(REDIS_URL_ENV, redis_url)
+        cache = create_response_cache()
+        assert cache is not None
+
+        async with asyncio.timeout(2):
+            assert await cache.get(Provider.ipapi_co, IP) is None
+            cache.set_in_background(Provider.ipapi_co, IP, BODY)
+            await cache.aclose()
+
+
+async def test_concurrent_reads_beyond_the_pool_size_wait_for_a_connection(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    pytest.importorskip("redis")
+    async with slow_redis_url(delay=0.02) as redis_url:
+        monkeypatch.setenv(REDIS_URL_ENV, redis_url)
+        monkeypatch.setattr("src.response_cache.REDIS_MAX_CONNECTIONS", 1)
+        # The "api" logger does not propagate to the root logger caplog listens on.
+        monkeypatch.setattr(logger, "propagate", True)
+        cache = create_response_cache()
+        assert cache is not None
+
+        # Three reads share one connection: each waits for it instead of failing with
+        # "Too many connections" and being logged as a Redis error.
+        results = await asyncio.gather(*(cache.get(Provider.ipapi_co, IP) for _ in range(3)))
+        await cache.aclose()
+
+    assert results == [None, None, None]
+    assert "Response cache read failed" not in caplog.text